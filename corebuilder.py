@@ -0,0 +1,364 @@
+'''
+    This file builds the OpenMOC geometry for a Design-a-Reactor core from a
+    compact description: a map of the assemblies in the core and a map of
+    the pins in each assembly. The pin cells, the sliced up water cells of
+    the reflector mesh, the assembly lattices and the core lattice are all
+    generated from the description, so alternate core loadings and sizes
+    and reflector meshes only need a new description.
+    The description itself is plain data and does not need OpenMOC.
+'''
+
+import json
+import hashlib
+import numpy as np
+
+
+# Pin cell codes in the pin maps and the material in each pin, where water
+# pins (W) are the moderator cells of the reflector
+PINS = {'U': 'UO2',
+        'L': 'MOX-4.3%',
+        'M': 'MOX-7%',
+        'H': 'MOX-8.7%',
+        'F': 'Fission Chamber',
+        'G': 'Guide Tube'}
+
+WATER = 'W'
+
+# The radii (cm) of the pin and of the water rings around it
+PIN_RADII = [0.54, 0.58, 0.62]
+
+# The width (cm) of a pin cell
+PIN_PITCH = 1.26
+
+# 15 x 15 pin maps of the assemblies by assembly code
+ASSEMBLIES = {
+    # UO2 assembly
+    'U': ['UUUUUUUUUUUUUUU',
+          'UUUUGUUGUUGUUUU',
+          'UUGUUUUUUUUUGUU',
+          'UUUUUUUUUUUUUUU',
+          'UGUUGUUGUUGUUGU',
+          'UUUUUUUUUUUUUUU',
+          'UUUUUUUUUUUUUUU',
+          'UGUUGUUFUUGUUGU',
+          'UUUUUUUUUUUUUUU',
+          'UUUUUUUUUUUUUUU',
+          'UGUUGUUGUUGUUGU',
+          'UUUUUUUUUUUUUUU',
+          'UUGUUUUUUUUUGUU',
+          'UUUUGUUGUUGUUUU',
+          'UUUUUUUUUUUUUUU'],
+
+    # MOX assembly
+    'M': ['LLLLLLLLLLLLLLL',
+          'LMMMGMMGMMGMMML',
+          'LMGMHHHHHHHMGML',
+          'LMMHHHHHHHHHMML',
+          'LGHHGHHGHHGHHGL',
+          'LMHHHHHHHHHHHML',
+          'LMHHHHHHHHHHHML',
+          'LGHHGHHFHHGHHGL',
+          'LMHHHHHHHHHHHML',
+          'LMHHHHHHHHHHHML',
+          'LGHHGHHGHHGHHGL',
+          'LMMHHHHHHHHHMML',
+          'LMGMHHHHHHHMGML',
+          'LMMMGMMGMMGMMML',
+          'LLLLLLLLLLLLLLL'],
+
+    # Water reflector
+    'W': ['WWWWWWWWWWWWWWW'] * 15}
+
+# 4 x 4 core to represent two bundles of UO2 and MOX assemblies and water
+CORE_MAP = ['WWWW',
+            'WUMW',
+            'WMUW',
+            'WWWW']
+
+# The number of pin pitches beyond the fuel over which the water cells are
+# sliced up on each side of the fuel, and the (rows, columns) sliced up in
+# each corner, as in the original Design-a-Reactor geometry
+SLICE_DEPTHS = {'top': 8, 'bottom': 8, 'left': 7, 'right': 7,
+                'top left': (7, 8), 'top right': (7, 8),
+                'bottom left': (7, 8), 'bottom right': (7, 7)}
+
+
+class CoreDescription(object):
+
+    def __init__(self, core_map=CORE_MAP, assemblies=ASSEMBLIES, pins=PINS,
+                 reflector_mesh=(10,), slice_depth=SLICE_DEPTHS):
+        '''
+        core_map       - rows of assembly codes, from the top of the core
+        assemblies     - square pin maps (rows of pin codes) by assembly code
+        pins           - the material in each pin by pin code
+        reflector_mesh - the N x N subdivisions of the water cells at each
+                         distance from the fuel in pin pitches, where cells
+                         further away than the list is long use its last
+                         subdivision
+        slice_depth    - the number of pin pitches from the fuel over which
+                         the water cells are sliced up, in every direction
+                         including the diagonals, or a dictionary of the
+                         depths beyond each side and corner of the fuel
+                         (see SLICE_DEPTHS)
+        '''
+
+        self.core_map = [str(row) for row in core_map]
+        self.assemblies = dict((code, [str(row) for row in pin_map])
+                               for code, pin_map in assemblies.items())
+        self.pins = dict(pins)
+        self.reflector_mesh = [int(n) for n in reflector_mesh]
+        self.slice_depth = dict(slice_depth) if isinstance(slice_depth, dict) \
+                           else int(slice_depth)
+
+        self.assembly_size = len(self.assemblies[self.core_map[0][0]])
+        self.assembly_pitch = self.assembly_size * PIN_PITCH
+
+
+    def key(self):
+        '''
+        Returns a hash of the description which identifies the geometry.
+        '''
+
+        content = json.dumps([self.core_map, self.assemblies, self.pins,
+                              self.reflector_mesh, self.slice_depth],
+                             sort_keys=True)
+        return hashlib.sha1(content).hexdigest()
+
+
+    def pinMap(self):
+        '''
+        Returns the array of pin codes across the full core, with the first
+        row at the top.
+        '''
+
+        return np.vstack([np.hstack([np.array([list(row) for row in
+                                               self.assemblies[code]])
+                                     for code in core_row])
+                          for core_row in self.core_map])
+
+
+    def sliceLevels(self):
+        '''
+        Returns the array of the N x N subdivision of each pin cell across
+        the full core, which is 1 for pins and for water cells beyond the
+        slice depth from the fuel.
+        '''
+
+        pins = self.pinMap()
+        levels = np.ones(pins.shape, dtype=np.int32)
+        distances = self.sliceDistances(pins != WATER)
+
+        for distance in np.unique(distances[distances > 0]):
+            level = min(distance-1, len(self.reflector_mesh)-1)
+            levels[distances == distance] = self.reflector_mesh[level]
+
+        return levels
+
+
+    def sliceDistances(self, fuel):
+        '''
+        Returns the array of the distance from the fuel in pin pitches of
+        each water cell to slice up, which is 0 for the other cells.
+        '''
+
+        distances = np.zeros(fuel.shape, dtype=np.int32)
+
+        if not isinstance(self.slice_depth, dict):
+
+            # Grow the fuel by one pin pitch (in every direction, including
+            # the diagonals) at a time and slice up the water cells it reaches
+            reached = fuel
+            for distance in range(1, self.slice_depth+1):
+                padded = np.pad(reached, 1, 'constant')
+                grown = np.zeros(reached.shape, dtype=bool)
+                for i in range(3):
+                    for j in range(3):
+                        grown |= padded[i:i+fuel.shape[0], j:j+fuel.shape[1]]
+
+                distances[grown & ~reached] = distance
+                reached = grown
+
+            return distances
+
+        # Slice up the water cells within the depth beyond the side or corner
+        # of the block of fuel they lie off
+        rows, cols = np.nonzero(fuel)
+        top, bottom, left, right = rows.min(), rows.max(), cols.min(), cols.max()
+
+        for p, q in zip(*np.nonzero(~fuel)):
+            vertical = 'top' if p < top else 'bottom' if p > bottom else ''
+            horizontal = 'left' if q < left else 'right' if q > right else ''
+
+            if vertical and horizontal:
+                max_rows, max_cols = self.slice_depth[vertical + ' ' + horizontal]
+            elif vertical:
+                max_rows, max_cols = self.slice_depth[vertical], 0
+            elif horizontal:
+                max_rows, max_cols = 0, self.slice_depth[horizontal]
+            else:
+                max_rows, max_cols = 0, 0
+
+            num_rows = max(top - p, p - bottom, 0)
+            num_cols = max(left - q, q - right, 0)
+            if num_rows <= max_rows and num_cols <= max_cols:
+                distances[p,q] = max(num_rows, num_cols, 1)
+
+        return distances
+
+
+    def bounds(self):
+        '''
+        Returns the (xmin, xmax, ymin, ymax) bounds (cm) of the core, which
+        is centered on the origin.
+        '''
+
+        half_width = len(self.core_map[0]) * self.assembly_pitch / 2.
+        half_height = len(self.core_map) * self.assembly_pitch / 2.
+        return -half_width, half_width, -half_height, half_height
+
+
+    def boundaryTypes(self):
+        '''
+        Returns the 'vacuum' or 'reflective' boundary conditions on the
+        (xmin, xmax, ymin, ymax) sides of the core.
+        '''
+
+        return 'vacuum', 'vacuum', 'vacuum', 'vacuum'
+
+
+# Built geometries, and the surfaces, cells and lattices they point to, by
+# description, materials and CMFD mesh
+_geometries = {}
+
+
+def buildGeometry(core, materials, mesh):
+    '''
+    Returns the OpenMOC geometry for a core description with the materials
+    (a dictionary of OpenMOC materials by name, as from materialize) and
+    CMFD mesh, with its flat source regions initialized. The geometry is
+    only built once for each description, materials and mesh.
+    '''
+
+    key = (core.key(), id(materials), id(mesh))
+    if key in _geometries:
+        return _geometries[key]['geometry']
+
+    import openmoc
+
+    # OpenMOC only keeps pointers to the surfaces, cells and lattices, so
+    # they are kept alive along with the geometry and the objects whose ids
+    # make up the key
+    built = {'materials': materials, 'mesh': mesh, 'surfaces': [],
+             'cells': [], 'lattices': []}
+    surfaces = built['surfaces']
+    cells = built['cells']
+    lattices = built['lattices']
+
+    # Universe and lattice ids, where universe 0 is the root universe
+    universe_ids = iter(range(1, 1000000))
+
+    circles = [openmoc.Circle(x=0., y=0., radius=r) for r in PIN_RADII]
+    surfaces.extend(circles)
+
+    water_id = materials['Water'].getId()
+
+    # Pin cells with rings and sectors in the pin and the water around it
+    pin_universes = {}
+    for code, material in sorted(core.pins.items()):
+        universe = next(universe_ids)
+        cells.append(openmoc.CellBasic(universe=universe,
+                                       material=materials[material].getId(),
+                                       rings=3, sectors=8))
+        cells[-1].addSurface(-1, circles[0])
+
+        for i, circle in enumerate(circles):
+            cells.append(openmoc.CellBasic(universe=universe,
+                                           material=water_id, sectors=8))
+            cells[-1].addSurface(+1, circle)
+            if i+1 < len(circles):
+                cells[-1].addSurface(-1, circles[i+1])
+
+        pin_universes[code] = universe
+
+    # Moderator cell
+    pin_universes[WATER] = next(universe_ids)
+    cells.append(openmoc.CellBasic(universe=pin_universes[WATER],
+                                   material=water_id))
+
+    # Sliced up water cells - n x n for each subdivision of the reflector mesh
+    levels = core.sliceLevels()
+    sliced_universes = {1: pin_universes[WATER]}
+    for n in map(int, np.unique(levels[levels > 1])):
+        lattice_id = next(universe_ids)
+        lattices.append(openmoc.Lattice(id=lattice_id, width_x=PIN_PITCH/n,
+                                        width_y=PIN_PITCH/n))
+        lattices[-1].setLatticeCells([[pin_universes[WATER]] * n] * n)
+
+        sliced_universes[n] = next(universe_ids)
+        cells.append(openmoc.CellFill(universe=sliced_universes[n],
+                                      universe_fill=lattice_id))
+
+    # Assembly lattices, shared by assemblies with the same pin cells
+    pins = core.pinMap()
+    size = core.assembly_size
+    assembly_universes = {}
+    core_cells = []
+
+    for i, core_row in enumerate(core.core_map):
+        core_cells.append([])
+
+        for j in range(len(core_row)):
+            assembly = tuple(tuple(sliced_universes[levels[p,q]]
+                                   if pins[p,q] == WATER
+                                   else pin_universes[pins[p,q]]
+                                   for q in range(j*size, (j+1)*size))
+                             for p in range(i*size, (i+1)*size))
+
+            if assembly not in assembly_universes:
+                lattice_id = next(universe_ids)
+                lattices.append(openmoc.Lattice(id=lattice_id,
+                                                width_x=PIN_PITCH,
+                                                width_y=PIN_PITCH))
+                lattices[-1].setLatticeCells([list(row) for row in assembly])
+
+                assembly_universes[assembly] = next(universe_ids)
+                cells.append(openmoc.CellFill(
+                    universe=assembly_universes[assembly],
+                    universe_fill=lattice_id))
+
+            core_cells[-1].append(assembly_universes[assembly])
+
+    # Core lattice
+    lattice_id = next(universe_ids)
+    lattices.append(openmoc.Lattice(id=lattice_id, width_x=core.assembly_pitch,
+                                    width_y=core.assembly_pitch))
+    lattices[-1].setLatticeCells(core_cells)
+
+    # Root cell bounded by the boundaries of the core
+    xmin, xmax, ymin, ymax = core.bounds()
+    planes = [openmoc.XPlane(x=xmin), openmoc.XPlane(x=xmax),
+              openmoc.YPlane(y=ymin), openmoc.YPlane(y=ymax)]
+    surfaces.extend(planes)
+
+    boundary_types = {'vacuum': openmoc.VACUUM,
+                      'reflective': openmoc.REFLECTIVE}
+    for plane, boundary_type in zip(planes, core.boundaryTypes()):
+        plane.setBoundaryType(boundary_types[boundary_type])
+
+    cells.append(openmoc.CellFill(universe=0, universe_fill=lattice_id))
+    cells[-1].addSurface(+1, planes[0])
+    cells[-1].addSurface(-1, planes[1])
+    cells[-1].addSurface(+1, planes[2])
+    cells[-1].addSurface(-1, planes[3])
+
+    geometry = openmoc.Geometry(mesh)
+    for material in materials.values(): geometry.addMaterial(material)
+    for cell in cells: geometry.addCell(cell)
+    for lattice in lattices: geometry.addLattice(lattice)
+
+    geometry.initializeFlatSourceRegions()
+
+    built['geometry'] = geometry
+    _geometries[key] = built
+
+    return geometry
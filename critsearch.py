@@ -0,0 +1,195 @@
+'''
+    This file searches for the critical value of one enrichment factor,
+    usually the soluble boron concentration, with the other factors held
+    fixed. The search takes secant steps on keff - 1, falling back to
+    bisection once the critical value is bracketed and a secant step leaves
+    the bracket. A search typically needs a handful of solves. Diffusion
+    solves are warm-started from the previous solution, but OpenMOC solves
+    are not, as this OpenMOC cannot seed its source iteration with fluxes.
+
+    Usage: python critsearch.py [uo2 mox1 mox2 mox3 poison boron]
+
+    searches for the critical boron factor with the diffusion solver for the
+    given enrichment factors (the defaults of the GUI sliders otherwise).
+'''
+
+import sys
+import numpy as np
+import materials as c5g7
+import outputparser
+
+
+# The boron factor (water absorption multiplier) per ppm of soluble boron
+BORON_FACTOR_PER_PPM = 0.000909
+
+# The enrichment factors of the GUI sliders in their initial positions
+DEFAULT_FACTORS = (1.0, 1.0, 1.0, 1.0, 1.0, 1100.0 * BORON_FACTOR_PER_PPM)
+
+
+def criticalitySearch(keffFunction, factors, factor='boron',
+                      bounds=(0., 2.), target=1., tolerance=1E-4,
+                      max_solves=12):
+    '''
+    Searches for the value of one enrichment factor which makes a reactor
+    critical. It takes in the following arguments:
+
+    keffFunction - a function returning keff for the six enrichment factors
+    factors      - the enrichment factors (uo2, mox1, mox2, mox3, poison,
+                   boron), where the searched factor is the first guess
+    factor       - the name of the factor to search on (see FACTORS)
+    bounds       - the range of values of the factor to search within
+    target       - the keff to search for
+    tolerance    - the largest acceptable difference between keff and target
+    max_solves   - the largest number of solves before giving up
+
+    Returns the critical value of the factor, its keff and the list of
+    (value, keff) pairs of each solve. Raises a ValueError if keff does not
+    reach the target within the bounds or the number of solves.
+    '''
+
+    index = c5g7.FACTORS.index(factor)
+    factors = list(factors)
+    history = []
+
+    def residual(value):
+        factors[index] = value
+        keff = keffFunction(tuple(factors))
+        history.append((value, keff))
+        return keff - target
+
+    # The second guess is a small step from the first
+    x0 = factors[index]
+    x1 = np.clip(x0 * 1.1 if x0 != 0. else 0.1, *bounds)
+    if x1 == x0:
+        x1 = np.clip(x0 * 0.9, *bounds)
+
+    f0 = residual(x0)
+    if abs(f0) < tolerance:
+        return x0, history[-1][1], history
+
+    f1 = residual(x1)
+
+    # The (value, residual) pairs on either side of the target, once found
+    bracket = [(x0, f0), (x1, f1)] if f0 * f1 < 0. else None
+
+    while abs(f1) >= tolerance:
+        if len(history) >= max_solves:
+            raise ValueError('No critical %s factor within %d solves' % \
+                             (factor, max_solves))
+
+        # Secant step, unless the last two solves have the same keff
+        if f1 != f0:
+            x2 = x1 - f1 * (x1 - x0) / (f1 - f0)
+        else:
+            x2 = x1
+
+        # Bisect the bracket if the secant step leaves it
+        if bracket is not None:
+            low, high = sorted([bracket[0][0], bracket[1][0]])
+            if not low < x2 < high:
+                x2 = 0.5 * (low + high)
+
+        x2 = float(np.clip(x2, *bounds))
+        if x2 == x1:
+            raise ValueError('No critical %s factor within %s' % \
+                             (factor, bounds))
+
+        f2 = residual(x2)
+
+        # Replace the end of the bracket on the same side of the target
+        if bracket is not None:
+            side = 0 if (bracket[0][1] < 0.) == (f2 < 0.) else 1
+            bracket[side] = (x2, f2)
+        elif f1 * f2 < 0.:
+            bracket = [(x1, f1), (x2, f2)]
+
+        x0, f0, x1, f1 = x1, f1, x2, f2
+
+    return x1, history[-1][1], history
+
+
+def readKeff(filename):
+    '''
+    Returns the final keff in an OpenMOC output file.
+    '''
+
+    with open(filename, 'r') as fh:
+        return outputparser.parseOutput(fh).keff
+
+
+class DiffusionKeff(object):
+    '''
+    Returns keff from the diffusion solver for a set of enrichment factors,
+    starting each solve from the previous solution.
+    '''
+
+    def __init__(self, solver=None):
+
+        import diffusion
+
+        if solver is None:
+            solver = diffusion.DiffusionSolver()
+
+        self.solver = solver
+
+
+    def __call__(self, factors):
+
+        self.solver.setMaterialsImage(c5g7.createMaterialsImage(*factors))
+
+        if self.solver.keff is None:
+            keff, fluxes = self.solver.solve()
+        else:
+            keff, fluxes = self.solver.solve(keff=self.solver.keff,
+                                             fluxes=self.solver.fluxes)
+
+        return keff
+
+
+class SimulatorKeff(object):
+    '''
+    Returns keff from OpenMOC run by a LocalSimulator for a set of enrichment
+    factors. The runs are not warm-started from the previous run of the
+    search: convergeSource starts every source iteration from a flat flux
+    and this OpenMOC has no way to seed it, so every run costs a full solve.
+    '''
+
+    def __init__(self, simulator, options=None):
+
+        self.simulator = simulator
+        self.options = options or simulator.options
+
+
+    def __call__(self, factors):
+
+        simulator = self.simulator
+        simulator.factors = factors
+
+        if simulator.use_materials_image:
+            simulator.materials_image = c5g7.createMaterialsImage(*factors)
+        else:
+            c5g7.writeMaterialsFile(*factors)
+
+        simulator.runStage(self.options)
+        return readKeff(simulator.output_file)
+
+
+def main():
+
+    if len(sys.argv) > 1:
+        factors = [float(factor) for factor in sys.argv[1:]]
+    else:
+        factors = list(DEFAULT_FACTORS)
+
+    boron, keff, history = criticalitySearch(DiffusionKeff(), factors)
+
+    for value, step_keff in history:
+        print 'boron = %7.1f ppm: k_eff = %f' % \
+              (value / BORON_FACTOR_PER_PPM, step_keff)
+
+    print 'Critical boron concentration = %.1f ppm (k_eff = %f, %d solves)' % \
+          (boron / BORON_FACTOR_PER_PPM, keff, len(history))
+
+
+if __name__ == '__main__':
+    main()
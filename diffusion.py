@@ -0,0 +1,343 @@
+'''
+    This file implements a multi-group finite difference diffusion solver for
+    the Design-a-Reactor core which only needs NumPy, SciPy and h5py. It
+    reads the same materials HDF5 file (or in-memory image) as OpenMOC and
+    solves on the pin cell mesh of a core description (see corebuilder.py),
+    with the pins homogenized with their moderator by volume. It is far less
+    accurate than the MOC solution but converges in well under a second, so
+    it can preview a configuration or test the pipeline without OpenMOC.
+
+    Usage: python diffusion.py [materials HDF5 file]
+'''
+
+import sys
+import time
+import h5py
+import numpy as np
+import scipy.sparse as sparse
+import scipy.sparse.linalg as linalg
+import materials as c5g7
+import corebuilder
+
+
+class DiffusionSolver(object):
+
+    def __init__(self, core=None, mesh=1):
+        '''
+        core - the core description to solve (defaults to the standard
+               Design-a-Reactor core)
+        mesh - the number of N x N mesh cells in each pin cell
+        '''
+
+        if core is None:
+            core = corebuilder.CoreDescription()
+
+        self.core = core
+        self.mesh = mesh
+        self.width = corebuilder.PIN_PITCH / mesh
+
+        # The pin cell codes of the core, refined to the mesh
+        pins = core.pinMap()
+        self.pins = pins.repeat(mesh, axis=0).repeat(mesh, axis=1)
+
+        # The fraction of each pin cell occupied by the pin
+        radius = corebuilder.PIN_RADII[0]
+        self.pin_fraction = np.pi * radius**2 / corebuilder.PIN_PITCH**2
+
+        self.xs = None
+        self.keff = None
+        self.fluxes = None
+        self.adjoint_fluxes = None
+        self.num_iterations = 0
+
+
+    def setMaterialsFile(self, filename='design-a-reactor-materials.hdf5'):
+        '''
+        Sets the cross-sections from a materials HDF5 file.
+        '''
+
+        f = h5py.File(filename, 'r')
+        self.setMaterials(c5g7.readMaterials(f))
+        f.close()
+
+
+    def setMaterialsImage(self, image):
+        '''
+        Sets the cross-sections from a materials HDF5 file image created by
+        materials.createMaterialsImage.
+        '''
+
+        f = c5g7.openMaterialsImage(image)
+        self.setMaterials(c5g7.readMaterials(f))
+        f.close()
+
+
+    def setMaterials(self, xs):
+        '''
+        Sets the cross-sections from a dictionary of materials data, as
+        returned by materials.readMaterials, and assembles the loss and
+        fission operators on the mesh.
+        '''
+
+        self.xs = xs
+        water = xs['Water']
+        num_groups = water['Total XS'].size
+
+        # Homogenize each type of pin cell with its moderator by volume
+        codes = sorted(self.core.pins) + [corebuilder.WATER]
+        homogenized = dict((xs_type, []) for xs_type in water)
+
+        for code in codes:
+            if code == corebuilder.WATER:
+                fraction = 0.
+                data = water
+            else:
+                fraction = self.pin_fraction
+                data = xs[self.core.pins[code]]
+
+            for xs_type in water:
+                homogenized[xs_type].append(fraction * data[xs_type] +
+                                            (1. - fraction) * water[xs_type])
+
+        homogenized = dict((xs_type, np.array(values))
+                           for xs_type, values in homogenized.items())
+
+        # The cross-sections in each mesh cell, indexed by (group, cell)
+        index = np.searchsorted(codes[:-1], self.pins.ravel())
+        index[self.pins.ravel() == corebuilder.WATER] = len(codes) - 1
+        sigma_t = homogenized['Total XS'][index].T
+        nu_sigma_f = homogenized['Nu Fission XS'][index].T
+        chi = homogenized['Chi'][index].T
+        sigma_s = homogenized['Scattering XS'][index].reshape(
+            -1, num_groups, num_groups)
+
+        # The water ring dilutes the pin's chi, which sums to one again
+        chi_sum = chi.sum(axis=0)
+        chi[:, chi_sum > 0.] /= chi_sum[chi_sum > 0.]
+
+        # The pin cell mesh has no transport xs, so D uses the total xs
+        diffusion = 1. / (3. * sigma_t)
+
+        # Loss operator: leakage and total xs on the diagonal blocks and
+        # scattering from (origin) group h into (destination) group g
+        blocks = [[None] * num_groups for g in range(num_groups)]
+        fission = [[None] * num_groups for g in range(num_groups)]
+
+        for g in range(num_groups):
+            for h in range(num_groups):
+                scatter = sparse.diags(sigma_s[:, h, g], 0)
+                if g == h:
+                    blocks[g][h] = self.leakageOperator(diffusion[g]) + \
+                                   sparse.diags(sigma_t[g], 0) - scatter
+                else:
+                    blocks[g][h] = -scatter
+
+                fission[g][h] = sparse.diags(chi[g] * nu_sigma_f[h], 0)
+
+        self.blocks = blocks
+        self.loss = sparse.bmat(blocks, format='csc')
+        self.fission = sparse.bmat(fission, format='csr')
+        self.num_groups = num_groups
+
+
+    def leakageOperator(self, diffusion):
+        '''
+        Returns the sparse finite difference leakage operator for one group
+        with the diffusion coefficient in each mesh cell, with the core's
+        vacuum (Marshak) or reflective boundary conditions.
+        '''
+
+        num_rows, num_cols = self.pins.shape
+        h = self.width
+        D = diffusion.reshape(num_rows, num_cols)
+        cells = np.arange(num_rows * num_cols).reshape(num_rows, num_cols)
+
+        diagonal = np.zeros((num_rows, num_cols))
+        rows, cols, values = [], [], []
+
+        # Couple each pair of neighbouring cells by the harmonic mean of D
+        for first, second, D1, D2 in \
+                [(cells[:,:-1], cells[:,1:], D[:,:-1], D[:,1:]),
+                 (cells[:-1,:], cells[1:,:], D[:-1,:], D[1:,:])]:
+            coupling = 2. * D1 * D2 / (D1 + D2) / h**2
+            diagonal.flat[first.ravel()] += coupling.ravel()
+            diagonal.flat[second.ravel()] += coupling.ravel()
+            rows.extend([first.ravel(), second.ravel()])
+            cols.extend([second.ravel(), first.ravel()])
+            values.extend([-coupling.ravel(), -coupling.ravel()])
+
+        # Leakage through the (xmin, xmax, ymin, ymax) sides of the core,
+        # where the first row of cells is at the top (ymax)
+        sides = [(slice(None), 0), (slice(None), -1), (-1, slice(None)),
+                 (0, slice(None))]
+
+        for side, boundary_type in zip(sides, self.core.boundaryTypes()):
+            if boundary_type == 'vacuum':
+                diagonal[side] += 2. * D[side] / (h * (h + 4. * D[side]))
+
+        rows.append(cells.ravel())
+        cols.append(cells.ravel())
+        values.append(diagonal.ravel())
+
+        return sparse.csc_matrix((np.concatenate(values),
+                                  (np.concatenate(rows),
+                                   np.concatenate(cols))),
+                                 shape=(cells.size, cells.size))
+
+
+    def solve(self, tolerance=1E-6, max_iters=1000, keff=1., fluxes=None,
+              adjoint=False, accelerate=True):
+        '''
+        Solves for keff and the fluxes by power iteration, solving one group
+        at a time with the latest fluxes in the others and a sparse LU
+        factorization of each group's loss operator. Unless accelerate is
+        unset, the iteration is accelerated by Chebyshev extrapolation of
+        the fluxes once the dominance ratio has settled over the plain
+        iterations. The iteration is warm-started from a previous keff and
+        (rows, cols, groups) array of fluxes if given. Returns keff and the
+        (rows, cols, groups) array of fluxes, normalized to a mean fission
+        source of one in the fissile cells. The adjoint problem, with the
+        transposed loss and fission operators, is solved instead if adjoint
+        is set, and its fluxes are kept in adjoint_fluxes rather than fluxes.
+        '''
+
+        if self.xs is None:
+            raise ValueError('The materials must be set before solving')
+
+        num_cells = self.pins.size
+
+        # The adjoint scatters from the thermal groups up to the fast ones,
+        # so its groups are solved from the last to the first
+        if adjoint:
+            blocks = [[self.blocks[h][g].T.tocsc()
+                       for h in range(self.num_groups)]
+                      for g in range(self.num_groups)]
+            fission = self.fission.T.tocsr()
+            order = range(self.num_groups)[::-1]
+        else:
+            blocks = self.blocks
+            fission = self.fission
+            order = range(self.num_groups)
+
+        if fluxes is None:
+            phi = np.ones(self.num_groups * num_cells)
+        else:
+            phi = np.asarray(fluxes, dtype=np.float64).reshape(
+                num_cells, self.num_groups).T.ravel()
+
+        # The within-group operators are factorized once and reused for
+        # every iteration
+        solves = [linalg.splu(blocks[g][g]).solve
+                  for g in range(self.num_groups)]
+
+        source = fission.dot(phi)
+        self.num_iterations = 0
+
+        # The dominance ratio estimated from the plain iterations, and the
+        # Chebyshev weight and previous fluxes of the extrapolation
+        ratios = []
+        dominance = None
+        omega = None
+        previous = None
+        step_norm = None
+
+        while self.num_iterations < max_iters:
+            groups = np.split(phi, self.num_groups)
+            sources = np.split(source / keff, self.num_groups)
+
+            for g in order:
+                scatter = sum(blocks[g][h].dot(groups[h])
+                              for h in range(self.num_groups) if h != g)
+                groups[g] = solves[g](sources[g] - scatter)
+
+            # Scale the new fluxes back to the fission source of the last
+            # iteration, so that the power iteration converges to a fixed
+            # point which can be extrapolated
+            new_phi = np.concatenate(groups)
+            new_keff = keff * fission.dot(new_phi).sum() / source.sum()
+            new_phi *= keff / new_keff
+            self.num_iterations += 1
+
+            step = new_phi - phi
+            if step_norm is not None and dominance is None:
+                ratios.append(np.linalg.norm(step) / step_norm)
+            step_norm = np.linalg.norm(step)
+
+            # Extrapolate once the ratio of successive steps has settled
+            settled = len(ratios) >= 3 and ratios[-1] < 1. and \
+                      abs(ratios[-1] - ratios[-2]) < 0.01 * ratios[-1]
+            if accelerate and dominance is None and settled:
+                dominance = ratios[-1]
+                omega = None
+
+            if dominance is not None:
+                # The Chebyshev weights for error modes decaying by factors
+                # between 0 and the dominance ratio per iteration
+                rho = dominance / (2. - dominance)
+                if omega is None:
+                    omega = 1.
+                elif omega == 1.:
+                    omega = 1. / (1. - rho**2 / 2.)
+                else:
+                    omega = 1. / (1. - rho**2 * omega / 4.)
+
+                extrapolated = phi + omega * 2. / (2. - dominance) * step
+                if omega > 1.:
+                    extrapolated += (omega - 1.) * (phi - previous)
+
+                # Start a new cycle from the plain iteration if extrapolating
+                # overshoots to negative fluxes
+                if (extrapolated < 0.).any():
+                    omega = None
+                else:
+                    new_phi = extrapolated
+
+            previous = phi
+            new_source = fission.dot(new_phi)
+
+            # RMS change in the normalized fission source and in keff
+            residual = np.linalg.norm(new_source / new_source.sum() -
+                                      source / source.sum()) * \
+                       np.sqrt(num_cells)
+            converged = residual < tolerance and \
+                        abs(new_keff - keff) < tolerance
+            phi, keff, source = new_phi, new_keff, new_source
+
+            if converged:
+                break
+
+        # Normalize to a mean fission source of one in the fissile cells
+        fissile = source.reshape(self.num_groups, num_cells).sum(axis=0) > 0.
+        phi *= fissile.sum() / source.sum()
+
+        fluxes = phi.reshape(self.num_groups, self.pins.shape[0],
+                             self.pins.shape[1]).transpose(1, 2, 0)
+
+        if adjoint:
+            self.adjoint_fluxes = fluxes
+        else:
+            self.keff = keff
+            self.fluxes = fluxes
+
+        return keff, fluxes
+
+
+def main():
+
+    if len(sys.argv) > 1:
+        filename = sys.argv[1]
+    else:
+        filename = 'design-a-reactor-materials.hdf5'
+
+    start = time.time()
+    solver = DiffusionSolver()
+    solver.setMaterialsFile(filename)
+    keff, fluxes = solver.solve()
+
+    print 'k_eff = %f' % keff
+    print 'Converged in %d iterations and %.3f sec' % \
+          (solver.num_iterations, time.time() - start)
+
+
+if __name__ == '__main__':
+    main()
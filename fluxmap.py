@@ -0,0 +1,143 @@
+'''
+    This file maps the flat source region (FSR) scalar fluxes onto a grid of
+    pixels for plotting. A raster of FSR ids is found by locating the FSR
+    under each pixel in the geometry, and the flux images for each energy
+    group are gathered from the array of FSR fluxes through the raster.
+    Locating the FSRs is by far the slowest step, so the raster is built
+    once per geometry and grid and kept on disk next to the cached tracks.
+'''
+
+import os
+import hashlib
+import numpy as np
+
+
+def rasterizeFSRs(geometry, gridsize, xmin, xmax, ymin, ymax):
+    '''
+    Returns a (gridsize, gridsize) array with the id of the FSR under each
+    pixel of an OpenMOC geometry, with the first row at the top (ymax).
+    '''
+
+    import openmoc
+
+    xcoords = np.linspace(xmin, xmax, gridsize+1)
+    xcoords = 0.5 * (xcoords[1:] + xcoords[:-1])
+    ycoords = np.linspace(ymax, ymin, gridsize+1)
+    ycoords = 0.5 * (ycoords[1:] + ycoords[:-1])
+
+    raster = np.zeros((gridsize, gridsize), dtype=np.int32)
+
+    for i, y in enumerate(ycoords):
+        for j, x in enumerate(xcoords):
+            point = openmoc.LocalCoords(x, y)
+            point.setUniverse(0)
+            geometry.findCell(point)
+            raster[i,j] = geometry.findFSRId(point)
+
+    return raster
+
+
+def rasterKey(geometry, gridsize, xmin, xmax, ymin, ymax):
+    '''
+    Returns the cache key for the raster of an OpenMOC geometry on a grid.
+    '''
+
+    content = '%s\n%d\n%r' % (geometry.toString(), gridsize,
+                               (xmin, xmax, ymin, ymax))
+    return hashlib.sha1(content).hexdigest()
+
+
+def loadRaster(geometry, gridsize, xmin, xmax, ymin, ymax,
+               cache_dir='track-cache'):
+    '''
+    Returns the raster of FSR ids of an OpenMOC geometry (see rasterizeFSRs)
+    from the cache directory, rasterizing the geometry and caching the
+    raster the first time the geometry and grid are seen. The raster is
+    always rebuilt if the cache directory is ''.
+    '''
+
+    if not cache_dir:
+        return rasterizeFSRs(geometry, gridsize, xmin, xmax, ymin, ymax)
+
+    key = rasterKey(geometry, gridsize, xmin, xmax, ymin, ymax)
+    filename = os.path.join(cache_dir, 'raster-%s.npy' % key)
+
+    if os.path.isfile(filename):
+        return np.load(filename)
+
+    raster = rasterizeFSRs(geometry, gridsize, xmin, xmax, ymin, ymax)
+
+    # Write to a scratch file and rename it so that concurrent runs never
+    # load a partially written raster
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    scratch = '%s.%d.npy' % (filename[:-4], os.getpid())
+    np.save(scratch, raster)
+    os.rename(scratch, filename)
+
+    return raster
+
+
+def getFluxes(solver, num_fsrs, num_groups):
+    '''
+    Returns the (FSRs, groups) array of scalar fluxes from an OpenMOC solver.
+    '''
+
+    fluxes = np.fromiter((solver.getFSRScalarFlux(fsr_id, group)
+                          for fsr_id in range(num_fsrs)
+                          for group in range(1, num_groups+1)),
+                         dtype=np.float64, count=num_fsrs*num_groups)
+
+    return fluxes.reshape(num_fsrs, num_groups)
+
+
+def fluxImages(fluxes, raster, energy_groups):
+    '''
+    Returns a (rows, cols, groups) array with the flux of each of the energy
+    groups (starting from 1) in each pixel of a raster of FSR ids, gathered
+    from the (FSRs, groups) array of scalar fluxes in a single indexing.
+    '''
+
+    groups = np.asarray(energy_groups) - 1
+    return np.asarray(fluxes)[:, groups][raster]
+
+
+def saveFluxes(filename, fluxes, raster):
+    '''
+    Saves the (FSRs, groups) array of scalar fluxes and the raster of FSR
+    ids to plot them through to a file, in place of plotted images.
+    '''
+
+    np.savez(filename, fluxes=np.asarray(fluxes, dtype=np.float32),
+             raster=raster)
+
+
+def loadFluxImages(filename):
+    '''
+    Returns the (rows, cols, groups) array of the flux of every energy group
+    in each pixel from a file saved by saveFluxes.
+    '''
+
+    data = np.load(filename)
+    fluxes = data['fluxes']
+    return fluxImages(fluxes, data['raster'], range(1, fluxes.shape[1]+1))
+
+
+def plotFluxes(fluxes, raster, energy_groups, \
+               filename='plots/fsr-flux-group-%d.png'):
+    '''
+    Plots the (FSRs, groups) array of scalar fluxes through a raster of FSR
+    ids for each of the energy groups (starting from 1) to an image file.
+    '''
+
+    import matplotlib.pyplot as plt
+
+    directory = os.path.dirname(filename)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    images = fluxImages(fluxes, raster, energy_groups)
+
+    for index, group in enumerate(energy_groups):
+        plt.imsave(filename % group, images[:,:,index], cmap='jet')
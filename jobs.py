@@ -0,0 +1,148 @@
+'''
+    This file runs solver processes as jobs, each in a scratch working
+    directory (sandbox) of its own, so that jobs never share the log/ and
+    plots/ directories or the result files the solver writes. A job can be
+    cancelled from another thread or timed out, which kills its process, so
+    that a stale run never holds on to the CPU.
+'''
+
+import os
+import shutil
+import tempfile
+import threading
+import subprocess
+from distutils.spawn import find_executable
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class SolverJob(object):
+
+    def __init__(self, command, stdin=None, timeout=None, prefix='job-'):
+        '''
+        command - the solver command as a list of arguments, which is run
+                  with the sandbox as its working directory
+        stdin   - a string of bytes to write to the solver's stdin, if any
+        timeout - the number of seconds after which the job is cancelled
+        prefix  - the prefix of the sandbox directory name
+        '''
+
+        self.command = command
+        self.stdin = stdin
+        self.timeout = timeout
+        self.directory = tempfile.mkdtemp(prefix=prefix)
+
+        self.process = None
+        self.timer = None
+        self.cancelled = False
+        self.timed_out = False
+        self.lock = threading.Lock()
+
+
+    def path(self, filename):
+        '''
+        Returns the path of a file in the job's sandbox.
+        '''
+
+        return os.path.join(self.directory, filename)
+
+
+    def start(self):
+        '''
+        Starts the solver process and returns its stdout, which is line
+        buffered so that its output can be followed while it runs.
+        '''
+
+        command = list(self.command)
+        if find_executable('stdbuf'):
+            command = ['stdbuf', '-oL'] + command
+        environment = dict(os.environ, PYTHONUNBUFFERED='1')
+
+        # Never start a job which was cancelled before it started
+        with self.lock:
+            if self.cancelled:
+                raise JobCancelled('Cancelled before starting')
+
+            self.process = subprocess.Popen(command, cwd=self.directory,
+                                            stdin=subprocess.PIPE,
+                                            stdout=subprocess.PIPE,
+                                            env=environment)
+
+        if self.timeout is not None:
+            self.timer = threading.Timer(self.timeout, self.expire)
+            self.timer.daemon = True
+            self.timer.start()
+
+        try:
+            if self.stdin is not None:
+                self.process.stdin.write(self.stdin)
+            self.process.stdin.close()
+        except IOError:
+            # The process died or was cancelled before reading its input,
+            # which wait() reports
+            pass
+
+        return self.process.stdout
+
+
+    def wait(self):
+        '''
+        Waits for the solver process to exit. Raises JobCancelled if the job
+        was cancelled, or a RuntimeError if it timed out or the solver failed.
+        '''
+
+        returncode = self.process.wait()
+
+        if self.timer is not None:
+            self.timer.cancel()
+
+        if self.timed_out:
+            raise RuntimeError('%s timed out after %g sec' % \
+                               (' '.join(self.command), self.timeout))
+        elif self.cancelled:
+            raise JobCancelled('Cancelled %s' % ' '.join(self.command))
+        elif returncode != 0:
+            raise RuntimeError('%s failed with exit status %d in %s' % \
+                               (' '.join(self.command), returncode,
+                                self.directory))
+
+
+    def communicate(self):
+        '''
+        Runs the job to completion and returns the solver output.
+        '''
+
+        output = self.start().read()
+        self.wait()
+        return output
+
+
+    def cancel(self):
+        '''
+        Cancels the job, killing the solver process if it is running.
+        '''
+
+        with self.lock:
+            self.cancelled = True
+
+            if self.process is not None and self.process.poll() is None:
+                self.process.terminate()
+
+
+    def expire(self):
+        '''
+        Kills the solver process of a job which ran out of time.
+        '''
+
+        self.timed_out = True
+        self.cancel()
+
+
+    def cleanup(self):
+        '''
+        Removes the job's sandbox.
+        '''
+
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -5,6 +5,10 @@ import numpy as np
 import widgets
 import materials
 import simulate
+import preview
+import perturbation
+import outputparser
+import critsearch
 from PyQt4.QtCore import *
 from PyQt4.QtGui import *
 
@@ -17,6 +21,8 @@ class MainWindow(QMainWindow):
         super(MainWindow, self).__init__(parent)
 
         self.openmoc_simulator = simulate.LocalSimulator()
+        self.openmoc_simulator.use_daemon = True
+        self.openmoc_simulator.progressive = True
 
         self.uo2_factor = 3.5
         self.mox1_factor = 4.3
@@ -80,27 +86,25 @@ class MainWindow(QMainWindow):
         self.top_left_frame.setLayout(self.top_left_layout)
 
         # Setup the bottom right quadrant with a display for keff convergence
-        self.keff_label = QLabel()
-        self.keff_label.setMaximumSize(1000, 375)
-        self.setupLabelPixmap(self.keff_label, 'keff.png', \
-                              self.bottom_right_layout, self.bottom_right_frame)
-
-        # Setup the top right quadrant with a display for the fluxes
-        self.flux7_label = QLabel()
-        self.flux7_title_label = QLabel('Thermal Flux: Low Energy Neutrons')
+        self.keff_plot = widgets.PlotWidget()
+        self.keff_plot.setMaximumSize(1000, 375)
+        self.setupKeffPlot()
+        self.bottom_right_layout.addWidget(self.keff_plot)
+        self.bottom_right_frame.setLayout(self.bottom_right_layout)
+
+        # Setup the top right quadrant with a display for the fluxes, each of
+        # which can show any energy group of the latest simulation
+        self.flux7_label = widgets.FluxDisplay(7, 'fsr-flux-group-7.png')
+        self.flux7_title_label = self.createGroupSelector(self.flux7_label)
         self.flux7_label.setMaximumSize(500, 350)
-        self.flux7_label.setPixmap(QPixmap('fsr-flux-group-7.png').scaled(self.flux7_label.size(), Qt.KeepAspectRatio))
-        self.flux7_label.setAlignment(Qt.AlignCenter)
-        self.flux7_title_label.setAlignment(Qt.AlignCenter)
+        self.flux7_label.load(self.openmoc_simulator.flux_file)
         self.top_right_layout.addWidget(self.flux7_label, 0, 1)
         self.top_right_layout.addWidget(self.flux7_title_label, 1, 1)
 
-        self.flux1_label = QLabel()
-        self.flux1_title_label = QLabel('Fast Flux: High Energy Neutrons')
+        self.flux1_label = widgets.FluxDisplay(1, 'fsr-flux-group-1.png')
+        self.flux1_title_label = self.createGroupSelector(self.flux1_label)
         self.flux1_label.setMaximumSize(500, 350)
-        self.flux1_label.setPixmap(QPixmap('fsr-flux-group-1.png').scaled(self.flux1_label.size(), Qt.KeepAspectRatio))
-        self.flux1_label.setAlignment(Qt.AlignCenter)
-        self.flux1_title_label.setAlignment(Qt.AlignCenter)
+        self.flux1_label.load(self.openmoc_simulator.flux_file)
         self.top_right_layout.addWidget(self.flux1_label, 0, 0)
         self.top_right_layout.addWidget(self.flux1_title_label, 1, 0)
         self.top_right_frame.setLayout(self.top_right_layout)
@@ -111,6 +115,7 @@ class MainWindow(QMainWindow):
         # Setup run button and reset button
         self.run_button = QPushButton("Run OpenMOC")
         self.reset_button = QPushButton("Reset")        
+        self.critical_button = QPushButton("Find Critical Boron")
 
         # Setup the sliders for fuel enrichment
         self.uo2_slider = QSlider(Qt.Horizontal)
@@ -171,6 +176,7 @@ class MainWindow(QMainWindow):
         self.mox_sliders_layout.addWidget(self.mox3_slider.label)
         self.buttons_layout.addWidget(self.run_button)
         self.buttons_layout.addWidget(self.reset_button)
+        self.buttons_layout.addWidget(self.critical_button)
 
         self.mox_sliders_frame = QFrame()
         self.mox_sliders_frame.setLayout(self.mox_sliders_layout)
@@ -185,13 +191,26 @@ class MainWindow(QMainWindow):
         self.buttons_frame.setLayout(self.buttons_layout)
         self.progress = QProgressBar()
         self.progress.setMinimum(0)
-        self.progress.setMaximum(10)
-        self.progress.setValue(10)
+        self.progress.setMaximum(100)
+        self.progress.setValue(100)
         self.progress.label = QLabel('Idle')
         self.progress.setAlignment(Qt.AlignCenter)
+
+        # Setup the keff estimate from previous runs for the slider settings
+        self.keff_preview = preview.KeffPreview(self.openmoc_simulator.cache.records(),
+                                                self.openmoc_simulator.options)
+        self.preview_label = QLabel()
+        self.preview_label.setAlignment(Qt.AlignCenter)
+
+        # The perturbation estimate of keff about the last OpenMOC run, which
+        # is set up once a run has finished
+        self.keff_perturbation = None
+        self.updatePreview()
+
         self.bottom_left_layout.addWidget(self.progress, 0,0)
-        self.bottom_left_layout.addWidget(self.sliders_frame, 1, 0)
-        self.bottom_left_layout.addWidget(self.buttons_frame, 2, 0)
+        self.bottom_left_layout.addWidget(self.preview_label, 1, 0)
+        self.bottom_left_layout.addWidget(self.sliders_frame, 2, 0)
+        self.bottom_left_layout.addWidget(self.buttons_frame, 3, 0)
         self.bottom_left_frame.setLayout(self.bottom_left_layout)
 
         # Connect buttons SIGNALs with actions
@@ -203,6 +222,19 @@ class MainWindow(QMainWindow):
         self.connect(self.boron_slider, SIGNAL('valueChanged(int)'), self.updateSliders)
         self.connect(self.run_button, SIGNAL('clicked()'), self.runSimulation)
         self.connect(self.reset_button, SIGNAL('clicked()'), self.reset)
+        self.connect(self.critical_button, SIGNAL('clicked()'), self.searchCritical)
+
+        # Follow each source iteration, and display the results of each
+        # simulation stage as soon as it finishes
+        self.connect(self.openmoc_simulator, \
+                     SIGNAL('iterationFinished(int, double, double, int)'), \
+                     self.advanceProgress)
+        self.connect(self.openmoc_simulator, SIGNAL('stageFinished(int)'), \
+                     self.displayResults)
+        self.connect(self.openmoc_simulator, SIGNAL('finished()'), \
+                     self.simulationFinished)
+        self.connect(self.openmoc_simulator, SIGNAL('criticalFound(double)'), \
+                     self.setCriticalBoron)
 
         # Add frames to each splitter
         self.right_split.addWidget(self.top_right_frame)
@@ -215,6 +247,14 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(self.master_split)
 
 
+    def closeEvent(self, event):
+        '''
+        Stops the resident OpenMOC solver when the window is closed
+        '''
+        self.openmoc_simulator.stopDaemon()
+        event.accept()
+
+
     def reset(self):
         '''
         Resets the slider positions
@@ -251,50 +291,157 @@ class MainWindow(QMainWindow):
         the user-defined enrichments, runs OpenMOC, copies back thermal flux
         plots and generates a keff convergence plot and finally repaints the GUI
         '''
+        # A new request replaces the one still running
+        if self.openmoc_simulator.isRunning():
+            self.openmoc_simulator.cancel()
+            self.openmoc_simulator.wait()
+
         self.progress.setValue(0)
         self.progress.update()
         self.progress.repaint()
         self.writeMaterialsFile()
 
+        self.progress.setFormat('Starting OpenMOC...')
         self.openmoc_simulator.spawnSimulationThread()
 
-        time.sleep(5.)
 
-        # loop over progress update
-        while(self.openmoc_simulator.isRunning()):
-            self.progress.setValue(self.progress.value()+1)
-            self.progress.update()
-            self.progress.repaint()
-            time.sleep(5.)
+    def searchCritical(self):
+        '''
+        Runs OpenMOC for a handful of boron concentrations, starting from the
+        current slider settings, to find the critical boron concentration
+        '''
+        self.openmoc_simulator.search_factor = 'boron'
+        self.runSimulation()
+
 
-        self.setupLabelPixmap(self.keff_label, 'keff.png', \
-                            self.bottom_right_layout, self.bottom_right_frame)
+    def setCriticalBoron(self, boron_factor):
+        '''
+        Moves the boron slider to the critical boron concentration
+        '''
+        boron_ppm = boron_factor / critsearch.BORON_FACTOR_PER_PPM
 
-        flux1_pixMap = QPixmap('fsr-flux-group-1.png').scaled(self.flux1_label.size(),\
-                                                            Qt.KeepAspectRatio)
-        flux7_pixMap = QPixmap('fsr-flux-group-7.png').scaled(self.flux7_label.size(),\
-                                                            Qt.KeepAspectRatio)
-        self.flux1_label.setPixmap(flux1_pixMap)
-        self.flux7_label.setPixmap(flux7_pixMap)
+        # Moving the slider must not call updateSliders, which would cancel
+        # the search that has just finished
+        self.boron_slider.blockSignals(True)
+        self.boron_slider.setSliderPosition(int(round((boron_ppm - 1100.0) / 22.0)))
+        self.boron_slider.blockSignals(False)
 
-        self.flux1_label.setAlignment(Qt.AlignCenter)
-        self.flux7_label.setAlignment(Qt.AlignCenter)
+        # Keep the exact critical concentration rather than the slider's
+        self.boron_factor = round(boron_ppm, 1)
+        self.boron_slider.label.setText('Soluble boron ppm: ' + \
+                                            str(self.boron_factor) + ' ppm')
+        self.updatePreview()
 
-        self.top_right_layout.addWidget(self.flux1_label)
-        self.top_right_layout.addWidget(self.flux7_label)
 
-        self.top_right_frame.setLayout(self.top_right_layout)
-        self.progress.setValue(10)
+    def advanceProgress(self, iteration, keff, residual, percent):
+        '''
+        Shows the latest source iteration and the progress towards source
+        convergence estimated from the residuals
+        '''
+        # Plot each iteration as it arrives, starting afresh with each stage
+        if iteration == 0:
+            self.keff_plot.clear()
+        self.keff_plot.add_point(keff, iteration)
+
+        self.progress.setValue(percent)
+        self.progress.setFormat(self.stageLabel() + \
+                                'Iteration %d: k = %.5f, residual = %.1E' \
+                                % (iteration, keff, residual))
         self.progress.update()
 
+
+    def displayResults(self, stage):
+        '''
+        Repaints the keff convergence and flux plots with the results of
+        the latest simulation stage
+        '''
+        self.showKeffs(self.openmoc_simulator.keffs, self.stageLabel())
+
+        # Both displays share the flux images of every group
+        self.flux1_label.load(self.openmoc_simulator.flux_file)
+        self.flux7_label.set_fluxes(self.flux1_label.images)
+
+
+    def stageLabel(self):
+        '''
+        Returns the label of the results of the running simulation stage,
+        which marks the coarse results shown until the refined ones arrive
+        '''
+        if self.openmoc_simulator.coarse:
+            return 'Coarse preview - '
+        return ''
+
+
+    def simulationFinished(self):
+        '''
+        Completes the progress bar once all simulation stages are done
+        '''
+        self.progress.setValue(100)
+        if self.openmoc_simulator.cancelled:
+            self.progress.setFormat('Cancelled')
+        elif self.openmoc_simulator.failed:
+            self.progress.setFormat('Failed')
+        else:
+            self.progress.setFormat('%p%')
+        self.progress.update()
+
+        # Refit the keff estimates to include the latest run
+        self.keff_preview.fit(self.openmoc_simulator.cache.records(),
+                              self.openmoc_simulator.options)
+        if not (self.openmoc_simulator.cancelled or \
+                self.openmoc_simulator.failed):
+            self.updatePerturbation()
+        self.updatePreview()
+
         print 'finished simulation'
 
 
+    def updatePerturbation(self):
+        '''
+        Solves the diffusion forward and adjoint problems for the enrichment
+        values of the last run, so that keff for the current enrichment
+        values is estimated as the keff of that run plus a perturbation
+        '''
+        simulator = self.openmoc_simulator
+        if simulator.factors is None or len(simulator.keffs) == 0:
+            return
+
+        if self.keff_perturbation is None:
+            self.keff_perturbation = perturbation.PerturbationEstimator( \
+                                        simulator.factors, simulator.keffs[-1])
+        else:
+            self.keff_perturbation.setReference(simulator.factors, \
+                                                simulator.keffs[-1])
+
+
     def writeMaterialsFile(self):
         '''
-        Writes a materials HDF5 input file for OpenMOC based on the enrichment
-        slider settings. Must cast the slider domain of [-1,1] into a more
-        useful range for modifying the enrichments
+        Writes a materials HDF5 input file (or an in-memory HDF5 image) for
+        OpenMOC based on the enrichment slider settings. Must cast the slider
+        domain of [-1,1] into a more useful range for modifying the enrichments
+        '''
+
+        uo2_factor, mox1_factor, mox2_factor, mox3_factor, poison_factor, \
+            boron_factor = self.materialMultipliers()
+        self.openmoc_simulator.factors = (uo2_factor, mox1_factor, \
+                                          mox2_factor, mox3_factor, \
+                                          poison_factor, boron_factor)
+
+        if self.openmoc_simulator.use_materials_image:
+            self.openmoc_simulator.materials_image = \
+                materials.createMaterialsImage(uo2_factor, mox1_factor, \
+                                               mox2_factor, mox3_factor, \
+                                               poison_factor, boron_factor)
+        else:
+            materials.writeMaterialsFile(uo2_factor, mox1_factor, mox2_factor, \
+                                         mox3_factor, poison_factor, boron_factor)
+
+
+    def materialMultipliers(self):
+        '''
+        Returns the factors to multiply the UO2, MOX-4.3%, MOX-7%, MOX-8.7%
+        fission, guide tube absorption and water absorption xs by for the
+        current enrichment values
         '''
 
         uo2_factor = 0.0 + self.uo2_factor * 0.285714
@@ -303,8 +450,9 @@ class MainWindow(QMainWindow):
         mox3_factor = 0.0 + self.mox3_factor * 0.114943
         poison_factor = 0.0 + self.poison_factor * 0.2
         boron_factor = 0.0 + self.boron_factor * 0.000909
-        materials.writeMaterialsFile(uo2_factor, mox1_factor, mox2_factor, \
-                                     mox3_factor, poison_factor, boron_factor)
+
+        return (uo2_factor, mox1_factor, mox2_factor, mox3_factor, \
+                poison_factor, boron_factor)
 
 
     def updateSliders(self):
@@ -312,6 +460,11 @@ class MainWindow(QMainWindow):
         Updates the slider label text with the current enrichment values
         '''
 
+        # The running simulation is for stale enrichment values, so free up
+        # the CPU for the next run
+        if self.openmoc_simulator.isRunning():
+            self.openmoc_simulator.cancel()
+
         self.convertSliderValues()
 
         self.uo2_slider.label.setText('UO2 enrichment: ' + \
@@ -327,6 +480,36 @@ class MainWindow(QMainWindow):
         self.boron_slider.label.setText('Soluble boron ppm: ' + \
                                             str(self.boron_factor) + ' ppm')
 
+        self.updatePreview()
+
+
+    def updatePreview(self):
+        '''
+        Shows the keff estimated from previous runs for the current enrichment
+        values without running the solver
+        '''
+
+        keff, confidence = self.keff_preview.estimate(self.materialMultipliers())
+
+        if keff is None:
+            text = 'Estimated k: run OpenMOC first'
+        else:
+            text = 'Estimated k = %.5f: %s (%d%% confidence)' \
+                   % (keff, preview.verdict(keff), round(100. * confidence))
+
+        # Show the perturbation estimate and the sensitivity of keff to each
+        # enrichment value, (value / k) dk / dvalue, about the last run
+        if self.keff_perturbation is not None:
+            factors = self.materialMultipliers()
+            keff = self.keff_perturbation.estimate(factors)
+            sensitivities = self.keff_perturbation.sensitivities(factors)
+            text += '\nPerturbed from the last run: k = %.5f: %s\n' \
+                    % (keff, preview.verdict(keff))
+            text += 'Sensitivities: ' + ', '.join('%s %+.3f' % item for item \
+                        in zip(materials.FACTORS, sensitivities))
+
+        self.preview_label.setText(text)
+
     def convertSliderValues(self):
         '''
         Converts the location of the slider into an enrichment value.
@@ -351,6 +534,54 @@ class MainWindow(QMainWindow):
         self.boron_factor = 1100.0 + 22.0 * position
 
 
+    def createGroupSelector(self, flux_display):
+        '''
+        Returns a combo box which selects the energy group shown by a flux
+        display, starting from the group it shows
+        '''
+        titles = {1: 'Fast Flux: High Energy Neutrons',
+                  7: 'Thermal Flux: Low Energy Neutrons'}
+
+        selector = QComboBox()
+        for group in range(1, materials.NUM_GROUPS+1):
+            selector.addItem(titles.get(group, 'Group %d Flux' % group))
+
+        selector.setCurrentIndex(flux_display.group - 1)
+        self.connect(selector, SIGNAL('currentIndexChanged(int)'), \
+                     lambda index: flux_display.set_group(index + 1))
+
+        return selector
+
+
+    def setupKeffPlot(self):
+        '''
+        Labels the keff convergence plot, draws the critical line and shows
+        the keffs of the last simulation, if any
+        '''
+        plot_item = self.keff_plot.pw.getPlotItem()
+        plot_item.setTitle('Multiplication Factor Convergence')
+        plot_item.setLabel('bottom', 'Iteration #')
+        plot_item.setLabel('left', 'Multiplication Factor')
+        self.keff_plot.add_reference_line(1.0)
+
+        output_file = self.openmoc_simulator.output_file
+        if os.path.isfile(output_file):
+            with open(output_file, 'r') as data:
+                self.showKeffs(outputparser.parseOutput(data).keffs)
+
+
+    def showKeffs(self, keffs, label=''):
+        '''
+        Plots the keff at each iteration of a simulation, with a verdict on
+        whether the reactor is critical by the final keff after the label
+        '''
+        self.keff_plot.set_data(keffs)
+
+        if len(keffs) > 0:
+            self.keff_plot.set_text('%s%s: k = %.5f' % (label, \
+                                    preview.verdict(keffs[-1]), keffs[-1]))
+
+
     def setupLabelPixmap(self, label, filename, layout, frame):
         '''
         Used to paint and repaint labels with new images, load them
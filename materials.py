@@ -5,12 +5,219 @@
     type, and writes the data to an HDF5 file. 
 '''
 
-import h5py
+import io
 import numpy
 
+# h5py is slow to import, and is only imported by the functions which read
+# or write HDF5 data so that importing this module stays cheap
+
+
+# The number of energy groups in the C5G7 cross-section data
+NUM_GROUPS = 7
+
+# The C5G7 materials in the order in which they are stored in the tables below
+MATERIALS = ['UO2', 'MOX-4.3%', 'MOX-7%', 'MOX-8.7%', 'Fission Chamber',
+             'Guide Tube', 'Water']
+
+# The group-wise reactions stored in the base cross-section table
+REACTIONS = ['Absorption XS', 'Fission XS', 'Nu Fission XS', 'Chi']
+
+# The enrichment factors passed to writeMaterialsFile, in argument order
+FACTORS = ['uo2', 'mox1', 'mox2', 'mox3', 'poison', 'boron']
+
+# Base C5G7 cross-sections indexed by (material, reaction, group)
+C5G7_XS = numpy.array([
+    # UO2
+    [[8.024800E-03, 3.717400E-03, 2.676900E-02, 9.623600E-02,
+      3.002000E-02, 1.112600E-01, 2.827800E-01],
+     [7.212060E-03, 8.193010E-04, 6.453200E-03, 1.856480E-02,
+      1.780840E-02, 8.303480E-02, 2.160040E-01],
+     [2.005998E-02, 2.027303E-03, 1.570599E-02, 4.518301E-02,
+      4.334208E-02, 2.020901E-01, 5.257105E-01],
+     [5.879100E-01, 4.117600E-01, 3.390600E-04, 1.176100E-07,
+      0., 0., 0.]],
+    # MOX-4.3%
+    [[8.433900E-03, 3.757700E-03, 2.797000E-02, 1.042100E-01,
+      1.399400E-01, 4.091800E-01, 4.093500E-01],
+     [7.627040E-03, 8.768980E-04, 5.698350E-03, 2.288720E-02,
+      1.076350E-02, 2.327570E-01, 2.489680E-01],
+     [2.175300E-02, 2.535103E-03, 1.626799E-02, 6.547410E-02,
+      3.072409E-02, 6.666510E-01, 7.139904E-01],
+     [5.879100E-01, 4.117600E-01, 3.390600E-04, 1.176100E-07,
+      0., 0., 0.]],
+    # MOX-7%
+    [[9.065700E-03, 4.296700E-03, 3.288100E-02, 1.220300E-01,
+      1.829800E-01, 5.684600E-01, 5.852100E-01],
+     [8.254460E-03, 1.325650E-03, 8.421560E-03, 3.287300E-02,
+      1.596360E-02, 3.237940E-01, 3.628030E-01],
+     [2.381395E-02, 3.858689E-03, 2.413400E-02, 9.436622E-02,
+      4.576988E-02, 9.281814E-01, 1.043200E+00],
+     [5.879100E-01, 4.117600E-01, 3.390600E-04, 1.176100E-07,
+      0., 0., 0.]],
+    # MOX-8.7%
+    [[9.486200E-03, 4.655600E-03, 3.624000E-02, 1.327200E-01,
+      2.084000E-01, 6.587000E-01, 6.901700E-01],
+     [8.672090E-03, 1.624260E-03, 1.027160E-02, 3.904470E-02,
+      1.925760E-02, 3.748880E-01, 4.305990E-01],
+     [2.518600E-02, 4.739509E-03, 2.947805E-02, 1.122500E-01,
+      5.530301E-02, 1.074999E+00, 1.239298E+00],
+     [5.879100E-01, 4.117600E-01, 3.390600E-04, 1.176100E-07,
+      0., 0., 0.]],
+    # Fission Chamber
+    [[5.113200E-04, 7.580100E-05, 3.157200E-04, 1.158200E-03,
+      3.397500E-03, 9.187800E-03, 2.324200E-02],
+     [4.790020E-09, 5.825640E-09, 4.637190E-07, 5.244060E-06,
+      1.453900E-07, 7.149720E-07, 2.080410E-06],
+     [1.323401E-08, 1.434500E-08, 1.128599E-06, 1.276299E-05,
+      3.538502E-07, 1.740099E-06, 5.063302E-06],
+     [5.879100E-01, 4.117600E-01, 3.390600E-04, 1.176100E-07,
+      0., 0., 0.]],
+    # Guide Tube
+    [[5.113200E-04, 7.581300E-05, 3.164300E-04, 1.167500E-03,
+      3.397700E-03, 9.188600E-03, 2.324400E-02],
+     [0., 0., 0., 0.,
+      0., 0., 0.],
+     [0., 0., 0., 0.,
+      0., 0., 0.],
+     [0., 0., 0., 0.,
+      0., 0., 0.]],
+    # Water
+    [[6.010500E-04, 1.579300E-05, 3.371600E-04, 1.940600E-03,
+      5.741600E-03, 1.500100E-02, 3.723900E-02],
+     [0., 0., 0., 0.,
+      0., 0., 0.],
+     [0., 0., 0., 0.,
+      0., 0., 0.],
+     [0., 0., 0., 0.,
+      0., 0., 0.]]])
+
+# Base C5G7 scattering matrices indexed by (material, origin, destination)
+C5G7_SCATTER = numpy.array([
+    # UO2
+    [[1.275370E-01, 4.237800E-02, 9.437400E-06, 5.516300E-09,
+      0., 0., 0.],
+     [0., 3.244560E-01, 1.631400E-03, 3.142700E-09,
+      0., 0., 0.],
+     [0., 0., 4.509400E-01, 2.679200E-03,
+      0., 0., 0.],
+     [0., 0., 0., 4.525650E-01,
+      5.566400E-03, 0., 0.],
+     [0., 0., 0., 1.252500E-04,
+      2.714010E-01, 1.025500E-02, 1.002100E-08],
+     [0., 0., 0., 0.,
+      1.296800E-03, 2.658020E-01, 1.680900E-02],
+     [0., 0., 0., 0.,
+      0., 8.545800E-03, 2.730800E-01]],
+    # MOX-4.3%
+    [[1.288760E-01, 4.141300E-02, 8.229000E-06, 5.040500E-09,
+      0., 0., 0.],
+     [0., 3.254520E-01, 1.639500E-03, 1.598200E-09,
+      0., 0., 0.],
+     [0., 0., 4.531880E-01, 2.614200E-03,
+      0., 0., 0.],
+     [0., 0., 0., 4.571730E-01,
+      5.539400E-03, 0., 0.],
+     [0., 0., 0., 1.604600E-04,
+      2.768140E-01, 9.312700E-03, 9.165600E-09],
+     [0., 0., 0., 0.,
+      2.005100E-03, 2.529620E-01, 1.485000E-02],
+     [0., 0., 0., 0.,
+      0., 8.494800E-03, 2.650070E-01]],
+    # MOX-7%
+    [[1.304570E-01, 4.179200E-02, 8.510500E-06, 5.132900E-09,
+      0., 0., 0.],
+     [0., 3.284280E-01, 1.643600E-03, 2.201700E-09,
+      0., 0., 0.],
+     [0., 0., 4.583710E-01, 2.533100E-03,
+      0., 0., 0.],
+     [0., 0., 0., 4.637090E-01,
+      5.476600E-03, 0., 0.],
+     [0., 0., 0., 1.761900E-04,
+      2.823130E-01, 8.728900E-03, 9.001600E-09],
+     [0., 0., 0., 0.,
+      2.276000E-03, 2.497510E-01, 1.311400E-02],
+     [0., 0., 0., 0.,
+      0., 8.864500E-03, 2.595290E-01]],
+    # MOX-8.7%
+    [[1.315040E-01, 4.204600E-02, 8.697200E-06, 5.193800E-09,
+      0., 0., 0.],
+     [0., 3.304030E-01, 1.646300E-03, 2.600600E-09,
+      0., 0., 0.],
+     [0., 0., 4.617920E-01, 2.474900E-03,
+      0., 0., 0.],
+     [0., 0., 0., 4.680210E-01,
+      5.433000E-03, 0., 0.],
+     [0., 0., 0., 1.859700E-04,
+      2.857710E-01, 8.397300E-03, 8.928000E-09],
+     [0., 0., 0., 0.,
+      2.391600E-03, 2.476140E-01, 1.232200E-02],
+     [0., 0., 0., 0.,
+      0., 8.968100E-03, 2.560930E-01]],
+    # Fission Chamber
+    [[6.616590E-02, 5.907000E-02, 2.833400E-04, 1.462200E-06,
+      2.064200E-08, 0., 0.],
+     [0., 2.403770E-01, 5.243500E-02, 2.499000E-04,
+      1.923900E-05, 2.987500E-06, 4.214000E-07],
+     [0., 0., 1.834250E-01, 9.228800E-02,
+      6.936500E-03, 1.079000E-03, 2.054300E-04],
+     [0., 0., 0., 7.907690E-02,
+      1.699900E-01, 2.586000E-02, 4.925600E-03],
+     [0., 0., 0., 3.734000E-05,
+      9.975700E-02, 2.067900E-01, 2.447800E-02],
+     [0., 0., 0., 0.,
+      9.174200E-04, 3.167740E-01, 2.387600E-01],
+     [0., 0., 0., 0.,
+      0., 4.979300E-02, 1.099100E+00]],
+    # Guide Tube
+    [[6.616590E-02, 5.907000E-02, 2.833400E-04, 1.462200E-06,
+      2.064200E-08, 0., 0.],
+     [0., 2.403770E-01, 5.243500E-02, 2.499000E-04,
+      1.923900E-05, 2.987500E-06, 4.214000E-07],
+     [0., 0., 1.834250E-01, 9.228800E-02,
+      6.936500E-03, 1.079000E-03, 2.054300E-04],
+     [0., 0., 0., 7.907690E-02,
+      1.699900E-01, 2.586000E-02, 4.925600E-03],
+     [0., 0., 0., 3.734000E-05,
+      9.975700E-02, 2.067900E-01, 2.447800E-02],
+     [0., 0., 0., 0.,
+      9.174200E-04, 3.167740E-01, 2.387600E-01],
+     [0., 0., 0., 0.,
+      0., 4.979300E-02, 1.099100E+00]],
+    # Water
+    [[4.447770E-02, 1.134000E-01, 7.234700E-04, 3.749900E-06,
+      5.318400E-08, 0., 0.],
+     [0., 2.823340E-01, 1.299400E-01, 6.234000E-04,
+      4.800200E-05, 7.448600E-06, 1.045500E-06],
+     [0., 0., 3.452560E-01, 2.245700E-01,
+      1.699900E-02, 2.644300E-03, 5.034400E-04],
+     [0., 0., 0., 9.102840E-02,
+      4.155100E-01, 6.373200E-02, 1.213900E-02],
+     [0., 0., 0., 7.143700E-05,
+      1.391380E-01, 5.118200E-01, 6.122900E-02],
+     [0., 0., 0., 0.,
+      2.215700E-03, 6.999130E-01, 5.373200E-01],
+     [0., 0., 0., 0.,
+      0., 1.324400E-01, 2.480700E+00]]])
+
+# Tabulated total cross-sections for materials whose total xs is not
+# recomputed from the absorption and scattering cross-sections
+TABULATED_TOTAL_XS = {
+    'Fission Chamber': numpy.array([1.260320E-01, 2.931600E-01, 2.842400E-01,
+                                    2.809600E-01, 3.344400E-01, 5.656400E-01,
+                                    1.172150E+00])}
+
+# Index into FACTORS of the factor which multiplies each material's fission
+# xs (and its absorption xs by proxy) or the absorption xs alone. Materials
+# which are not manipulated point to the trailing unit factor.
+NO_FACTOR = len(FACTORS)
+FISSION_FACTOR = numpy.array([0, 1, 2, 3, NO_FACTOR, NO_FACTOR, NO_FACTOR])
+ABSORPTION_FACTOR = numpy.array([NO_FACTOR, NO_FACTOR, NO_FACTOR, NO_FACTOR,
+                                 NO_FACTOR, 4, 5])
+
 
 def writeMaterialsFile(uo2_enr_mult, mox1_enr_mult, mox2_enr_mult, \
-                      mox3_enr_mult, poison_enr_mult, boron_enr_mult):
+                      mox3_enr_mult, poison_enr_mult, boron_enr_mult, \
+                      filename='design-a-reactor-materials.hdf5'):
     '''
         This method writes an HDF5 file for materials data for OpenMOC.
         It takes in the following arguments:
@@ -29,6 +236,7 @@ def writeMaterialsFile(uo2_enr_mult, mox1_enr_mult, mox2_enr_mult, \
         boron_enr_mult  - a factor to multiply the water absorption xs
                           by to simulate increasing the soluble boron
                           concentration
+        filename        - the HDF5 file to write the materials data to
     '''
 
 
@@ -39,299 +247,248 @@ def writeMaterialsFile(uo2_enr_mult, mox1_enr_mult, mox2_enr_mult, \
     print 'poison enr mult = %f' % (poison_enr_mult)
     print 'boron enr mult = %f' % (boron_enr_mult)
 
+    import h5py
+
     # Create the file to store the manipulated C5G7 multi-group cross-sections
-    f = h5py.File('design-a-reactor-materials.hdf5', 'w')
-    f.attrs["Energy Groups"] = 7
+    f = h5py.File(filename, 'w')
+    writeMaterials(f, [uo2_enr_mult, mox1_enr_mult, mox2_enr_mult,
+                       mox3_enr_mult, poison_enr_mult, boron_enr_mult])
+
+    # Close the hdf5 data file
+    f.close()
+
+
+
+def createMaterialsImage(uo2_enr_mult, mox1_enr_mult, mox2_enr_mult, \
+                         mox3_enr_mult, poison_enr_mult, boron_enr_mult):
+    '''
+        This method builds the same HDF5 materials data as writeMaterialsFile
+        entirely in memory with the h5py core driver and returns the raw
+        file image as a string of bytes. The image can be handed straight to
+        the solver process (see materializeImage) without touching the disk.
+        It takes the same enrichment factors as writeMaterialsFile.
+    '''
+
+    import h5py
+
+    # The file name is only a label since nothing is written to the disk
+    f = h5py.File('design-a-reactor-materials-image.hdf5', 'w', \
+                  driver='core', backing_store=False)
+    writeMaterials(f, [uo2_enr_mult, mox1_enr_mult, mox2_enr_mult,
+                       mox3_enr_mult, poison_enr_mult, boron_enr_mult])
+
+    f.flush()
+    image = f.id.get_file_image()
+    f.close()
+
+    return image
+
+
+
+def openMaterialsImage(image):
+    '''
+        Opens an HDF5 file image from createMaterialsImage as a read-only
+        h5py File with the same layout as the materials HDF5 file.
+    '''
+
+    import h5py
+
+    return h5py.File(io.BytesIO(image), 'r')
+
+
+
+def materializeImage(image):
+    '''
+        Creates OpenMOC materials from an HDF5 file image created by
+        createMaterialsImage, mirroring openmoc.materialize.materialize for
+        a materials HDF5 file. Returns a dictionary of materials keyed by
+        name.
+    '''
+
+    import openmoc
+
+    f = openMaterialsImage(image)
+    num_groups = int(f.attrs["Energy Groups"])
+    materials = {}
+
+    for name in f:
+        material = openmoc.Material(openmoc.material_id())
+        material.setNumEnergyGroups(num_groups)
+        setMaterialData(material, f[name])
+        materials[name] = material
+
+    f.close()
+
+    return materials
+
+
+
+def updateMaterials(materials, image):
+    '''
+        Replaces the cross-sections of existing OpenMOC materials, keyed by
+        name as returned by materializeImage, with those in an HDF5 file
+        image. The materials keep their ids, so the geometry, tracks and
+        solver built with them can be reused as they are.
+    '''
+
+    f = openMaterialsImage(image)
+
+    for name, material in materials.items():
+        setMaterialData(material, f[name])
+
+    f.close()
+
+
+
+def readMaterials(f):
+    '''
+        Reads the cross-sections of every material in an open h5py File with
+        the layout of the materials HDF5 file (or an image opened by
+        openMaterialsImage), without needing OpenMOC. Returns a dictionary
+        keyed by material name of dictionaries of arrays keyed by dataset
+        name.
+    '''
+
+    return dict((name, dict((xs_type, f[name][xs_type][...])
+                            for xs_type in f[name]))
+                for name in f)
+
+
+
+def setMaterialData(material, data):
+    '''
+        Sets the cross-sections of an OpenMOC material from the datasets of
+        one material's group in a materials HDF5 file.
+    '''
+
+    material.setSigmaT(data['Total XS'][...])
+    material.setSigmaA(data['Absorption XS'][...])
+    material.setSigmaS(data['Scattering XS'][...])
+    material.setSigmaF(data['Fission XS'][...])
+    material.setNuSigmaF(data['Nu Fission XS'][...])
+    material.setChi(data['Chi'][...])
+
+
+
+def writeMaterials(f, factors):
+    '''
+        This method writes the C5G7 materials data manipulated by a single
+        set of enrichment factors (uo2, mox1, mox2, mox3, poison, boron) to
+        an open h5py File.
+    '''
+
+    # Manipulate the C5G7 cross-sections for this single configuration
+    xs = computeCrossSections(factors)
+
+    f.attrs["Energy Groups"] = NUM_GROUPS
 
 
     #### NOTE: Should we also multiply sigma_s????
     #### NOTE: Should we also increase absorption minus fission????
 
 
-    ###########################################################################
-    ##############################      UO2      ##############################
-    ###########################################################################
-
-    # Create a subgroup for UO2 materials data
-    uo2 = f.create_group('UO2')
-    
-    sigma_f = numpy.array([7.212060E-03, 8.193010E-04, 6.453200E-03,
-                        1.856480E-02, 1.780840E-02, 8.303480E-02, 
-                           2.160040E-01]) * uo2_enr_mult
-    nu_sigma_f = numpy.array([2.005998E-02, 2.027303E-03, 1.570599E-02, 
-                        4.518301E-02, 4.334208E-02, 2.020901E-01, 
-                              5.257105E-01]) * uo2_enr_mult
-    sigma_a = numpy.array([8.024800E-03, 3.717400E-03, 2.676900E-02, 
-                            9.623600E-02, 3.002000E-02, 1.112600E-01, 
-                           2.827800E-01])
-    sigma_a += (uo2_enr_mult - 1.0) * sigma_f
-    sigma_s = numpy.array([1.275370E-01, 4.237800E-02, 9.437400E-06, 
-                           5.516300E-09, 0., 0., 0., 0., 3.244560E-01,
-                           1.631400E-03, 3.142700E-09, 0., 0., 0., 0.,
-                           0., 4.509400E-01, 2.679200E-03, 0., 0., 0., 
-                           0.,	0., 0., 4.525650E-01, 5.566400E-03, 0., 
-                           0., 0., 0., 0., 1.252500E-04, 2.714010E-01,
-                           1.025500E-02, 1.002100E-08, 0., 0.,	0., 0.,
-                           1.296800E-03, 2.658020E-01, 1.680900E-02, 
-                           0., 0., 0., 0., 0., 8.545800E-03, 
-                           2.730800E-01])
-    chi = numpy.array([5.87910E-01, 4.11760E-01, 3.39060E-04, 
-                        1.17610E-07, 0., 0., 0.])
-    sigma_t = computeSigmaT(sigma_a, sigma_s, 7)
-
-    # Create datasets for each cross-section type
-    uo2.create_dataset('Total XS', data=sigma_t) 
-    uo2.create_dataset('Absorption XS', data=sigma_a)
-    uo2.create_dataset('Scattering XS', data=sigma_s)
-    uo2.create_dataset('Fission XS', data=sigma_f)
-    uo2.create_dataset('Nu Fission XS', data=nu_sigma_f)
-    uo2.create_dataset('Chi', data=chi)
-
-
-    ###########################################################################
-    ############################      MOX (4.3%)     ##########################
-    ###########################################################################
-
-    # Create a subgroup for MOX-4.3%  materials data
-    mox43 = f.create_group('MOX-4.3%')
-
-    sigma_f = numpy.array([7.62704E-03, 8.76898E-04, 5.69835E-03, 
-                           2.28872E-02, 1.07635E-02, 2.32757E-01, 
-                           2.48968E-01]) * mox1_enr_mult
-    nu_sigma_f = numpy.array([2.175300E-02, 2.535103E-03, 1.626799E-02, 
-                              6.547410E-02, 3.072409E-02, 6.666510E-01, 
-                              7.139904E-01]) * mox1_enr_mult
-
-    sigma_a = numpy.array([8.433900E-03, 3.757700E-03, 2.797000E-02, 
-                           1.042100E-01, 1.399400E-01, 4.091800E-01, 
-                           4.093500E-01])
-    sigma_a += (mox1_enr_mult - 1.0) * sigma_f
-    sigma_s = numpy.array([1.288760E-01, 4.141300E-02, 8.229000E-06, 
-                           5.040500E-09, 0., 0., 0., 0., 3.254520E-01, 
-                           1.639500E-03, 1.598200E-09, 0., 0., 0., 0., 0., 
-                           4.531880E-01, 2.614200E-03, 0., 0., 0., 0., 0., 0., 
-                           4.571730E-01, 5.539400E-03, 0., 0., 0., 0., 0., 
-                           1.604600E-04, 2.768140E-01, 9.312700E-03, 
-                           9.165600E-09, 0., 0., 0., 0., 2.005100E-03, 
-                           2.529620E-01, 1.485000E-02, 0., 0., 0., 0., 0., 
-                           8.494800E-03, 2.650070E-01])
-    chi = numpy.array([5.87910E-01, 4.11760E-01, 3.39060E-04, 1.17610E-07,
-                       0., 0., 0.])
-    sigma_t = computeSigmaT(sigma_a, sigma_s, 7)
-
-    # Create datasets for each cross-section type
-    mox43.create_dataset('Total XS', data=sigma_t)
-    mox43.create_dataset('Absorption XS', data=sigma_a)
-    mox43.create_dataset('Scattering XS', data=sigma_s)
-    mox43.create_dataset('Fission XS', data=sigma_f)
-    mox43.create_dataset('Nu Fission XS', data=nu_sigma_f)
-    mox43.create_dataset('Chi', data=chi)
-
-
-    ###########################################################################
-    ############################      MOX (7%)     ############################
-    ###########################################################################
-
-    # Create a subgroup for MOX-7% materials data
-    mox7 = f.create_group('MOX-7%')
-
-    sigma_f = numpy.array([8.25446E-03, 1.32565E-03, 8.42156E-03, 
-                           3.28730E-02, 1.59636E-02, 3.23794E-01, 
-                           3.62803E-01]) * mox2_enr_mult
-    nu_sigma_f = numpy.array([2.381395E-02, 3.858689E-03, 2.413400E-02, 
-                              9.436622E-02, 4.576988E-02, 9.281814E-01, 
-                              1.043200E+00]) * mox2_enr_mult
-    sigma_a = numpy.array([9.065700E-03, 4.296700E-03, 3.288100E-02, 
-                           1.220300E-01, 1.829800E-01, 5.684600E-01, 
-                           5.852100E-01])
-    sigma_a += (mox2_enr_mult - 1.0) * sigma_f
-    sigma_s = numpy.array([1.304570E-01, 4.179200E-02, 8.510500E-06, 
-                           5.132900E-09, 0., 0., 0., 0., 3.284280E-01, 
-                           1.643600E-03, 2.201700E-09, 0., 0., 0., 0., 0., 
-                           4.583710E-01, 2.533100E-03, 0., 0., 0., 0., 0., 0., 
-                           4.637090E-01, 5.476600E-03, 0., 0., 0., 0., 0., 
-                           1.761900E-04, 2.823130E-01, 8.728900E-03, 
-                           9.001600E-09, 0., 0., 0., 0., 2.276000E-03, 
-                           2.497510E-01, 1.311400E-02, 0., 0., 0., 0., 0., 
-                           8.864500E-03, 2.595290E-01])
-    chi = numpy.array([5.87910E-01, 4.11760E-01, 3.39060E-04, 1.17610E-07, 
-                       0., 0., 0.])
-    sigma_t = computeSigmaT(sigma_a, sigma_s, 7)
-
-    # Create datasets for each cross-section type
-    mox7.create_dataset('Total XS', data=sigma_t)
-    mox7.create_dataset('Absorption XS', data=sigma_a)
-    mox7.create_dataset('Scattering XS', data=sigma_s)
-    mox7.create_dataset('Fission XS', data=sigma_f)
-    mox7.create_dataset('Nu Fission XS', data=nu_sigma_f)
-    mox7.create_dataset('Chi', data=chi)
-
-
-    ###########################################################################
-    ############################      MOX (8.7%)     ##########################
-    ###########################################################################
-
-    # Create a subgroup for MOX-8.7% materials data
-    mox87 = f.create_group('MOX-8.7%')
-
-    sigma_f = numpy.array([8.67209E-03, 1.62426E-03, 1.02716E-02, 
-                           3.90447E-02, 1.92576E-02, 3.74888E-01, 
-                           4.30599E-01]) * mox3_enr_mult
-    nu_sigma_f = numpy.array([2.518600E-02, 4.739509E-03, 2.947805E-02, 
-                              1.122500E-01, 5.530301E-02, 1.074999E+00, 
-                              1.239298E+00]) * mox3_enr_mult
-    sigma_a = numpy.array([9.486200E-03, 4.655600E-03, 3.624000E-02, 
-                           1.327200E-01, 2.084000E-01, 6.587000E-01, 
-                           6.901700E-01])
-    sigma_a += (mox3_enr_mult - 1.0) * sigma_f
-    sigma_s = numpy.array([1.315040E-01, 4.204600E-02, 8.697200E-06, 
-                           5.193800E-09, 0., 0., 0., 0., 3.304030E-01, 
-                           1.646300E-03, 2.600600E-09, 0., 0., 0., 0., 0., 
-                           4.617920E-01, 2.474900E-03, 0., 0., 0., 0., 0., 0., 
-                           4.680210E-01, 5.433000E-03, 0., 0., 0., 0., 0., 
-                           1.859700E-04, 2.857710E-01, 8.397300E-03, 
-                           8.928000E-09, 0., 0., 0., 0., 2.391600E-03, 
-                           2.476140E-01, 1.232200E-02, 0., 0., 0., 0., 0., 
-                           8.968100E-03, 2.560930E-01])
-    chi = numpy.array([5.87910E-01, 4.11760E-01, 3.39060E-04, 1.17610E-07,
-                       0., 0., 0.])
-    sigma_t = computeSigmaT(sigma_a, sigma_s, 7)
-
-    # Create datasets for each cross-section type
-    mox87.create_dataset('Total XS', data=sigma_t)
-    mox87.create_dataset('Absorption XS', data=sigma_a)
-    mox87.create_dataset('Scattering XS', data=sigma_s)
-    mox87.create_dataset('Fission XS', data=sigma_f)
-    mox87.create_dataset('Nu Fission XS', data=nu_sigma_f)
-    mox87.create_dataset('Chi', data=chi)
-
-
-    ###########################################################################
-    ##########################      Fission Chamber     #######################
-    ###########################################################################
-
-    # Create a subgroup for fission chamber materials data
-    fiss_chamber = f.create_group('Fission Chamber')
-
-    sigma_f = numpy.array([4.79002E-09, 5.82564E-09, 4.63719E-07, 
-                           5.24406E-06, 1.45390E-07, 7.14972E-07, 
-                           2.08041E-06])
-    nu_sigma_f = numpy.array([1.323401E-08, 1.434500E-08, 1.128599E-06,
-                              1.276299E-05, 3.538502E-07, 1.740099E-06, 
-                              5.063302E-06])
-    sigma_a = numpy.array([5.113200E-04, 7.580100E-05, 3.157200E-04,
-                           1.158200E-03, 3.397500E-03, 9.187800E-03,
-                           2.324200E-02])
-    sigma_s = numpy.array([6.616590E-02, 5.907000E-02, 2.833400E-04, 
-                           1.462200E-06, 2.064200E-08, 0., 0., 0., 2.403770E-01,
-                           5.243500E-02, 2.499000E-04, 1.923900E-05, 
-                           2.987500E-06, 4.214000E-07,  0., 0., 1.834250E-01, 
-                           9.228800E-02, 6.936500E-03, 1.079000E-03, 
-                           2.054300E-04, 0., 0., 0., 7.907690E-02, 1.699900E-01,
-                           2.586000E-02, 4.925600E-03, 0., 0., 0., 3.734000E-05,
-                           9.975700E-02, 2.067900E-01, 2.447800E-02, 0., 0., 0.,
-                           0., 9.174200E-04, 3.167740E-01, 2.387600E-01, 0., 0.,
-                           0., 0., 0., 4.979300E-02, 1.09910E+00])
-    chi = numpy.array([5.87910E-01, 4.11760E-01, 3.39060E-04, 
-                       1.17610E-07, 0., 0., 0.])
-    sigma_t = numpy.array([1.260320E-01, 2.931600E-01, 2.842400E-01, 
-                           2.809600E-01, 3.344400E-01, 5.656400E-01, 
-                           1.172150E+00])
-
-    # Create datasets for each cross-section type
-    fiss_chamber.create_dataset('Total XS', data=sigma_t)
-    fiss_chamber.create_dataset('Absorption XS', data=sigma_a)
-    fiss_chamber.create_dataset('Scattering XS', data=sigma_s)
-    fiss_chamber.create_dataset('Fission XS', data=sigma_f)
-    fiss_chamber.create_dataset('Nu Fission XS', data=nu_sigma_f)
-    fiss_chamber.create_dataset('Chi', data=chi)
-
-
-    ###########################################################################
-    ############################      Guide Tube      #########################
-    ###########################################################################
-
-    # Create a subgroup for guide tube materials data
-    guide_tube = f.create_group('Guide Tube')
-    
-    sigma_f = numpy.zeros(7)
-    nu_sigma_f = numpy.zeros(7)
-    sigma_a = numpy.array([5.113200E-04, 7.581300E-05, 3.164300E-04, 
-                           1.167500E-03, 3.397700E-03, 9.188600E-03, 
-                           2.324400E-02]) * poison_enr_mult
-    sigma_s = numpy.array([6.616590E-02, 5.907000E-02, 2.833400E-04, 
-                    1.462200E-06, 2.064200E-08, 0., 0., 0., 2.403770E-01,
-                    5.243500E-02, 2.499000E-04, 1.923900E-05, 2.987500E-06, 
-                    4.214000E-07, 0., 0., 1.834250E-01, 9.228800E-02, 
-                    6.936500E-03, 1.079000E-03, 2.054300E-04, 0., 0., 0.,
-                    7.907690E-02, 1.699900E-01, 2.586000E-02, 4.925600E-03,
-                    0., 0., 0., 3.734000E-05, 9.975700E-02, 2.067900E-01,
-                    2.447800E-02, 0., 0., 0., 0., 9.174200E-04, 3.167740E-01, 
-                    2.387600E-01, 0., 0., 0., 0., 0., 4.979300E-02, 
-                    1.099100E+00])
-    chi = numpy.zeros(7)
-    sigma_t = computeSigmaT(sigma_a, sigma_s, 7)
-
-    # Create datasets for each cross-section type
-    guide_tube.create_dataset('Total XS', data=sigma_t)
-    guide_tube.create_dataset('Absorption XS', data=sigma_a)
-    guide_tube.create_dataset('Scattering XS', data=sigma_s)
-    guide_tube.create_dataset('Fission XS', data=sigma_f)
-    guide_tube.create_dataset('Nu Fission XS', data=nu_sigma_f)
-    guide_tube.create_dataset('Chi', data=chi)
-
-
-    ###########################################################################
-    ##############################      Water      ############################
-    ###########################################################################
-
-    # Create a subgroup for water materials data
-    water = f.create_group('Water')
-    
-    sigma_f = numpy.zeros(7)
-    nu_sigma_f = numpy.zeros(7)
-    sigma_a = numpy.array([6.010500E-04, 1.579300E-05, 3.371600E-04,
-                           1.940600E-03, 5.741600E-03, 1.500100E-02, 
-                           3.723900E-02]) * boron_enr_mult
-    sigma_s = numpy.array([4.447770E-02, 1.134000E-01, 7.234700E-04,
-                           3.749900E-06, 5.318400E-08, 0., 0., 0., 2.823340E-01,
-                           1.299400E-01, 6.234000E-04, 4.800200E-05, 
-                           7.448600E-06, 1.045500E-06, 0., 0., 3.452560E-01, 
-                           2.245700E-01, 1.699900E-02, 2.644300E-03, 
-                           5.034400E-04, 0., 0., 0.,
-                           9.102840E-02, 4.155100E-01, 6.373200E-02, 
-                           1.213900E-02, 0., 0., 0., 7.143700E-05, 1.391380E-01,
-                           5.118200E-01, 6.122900E-02, 0., 0., 0., 0., 
-                           2.215700E-03, 6.999130E-01, 5.373200E-01, 0., 0., 0.,
-                           0., 0., 1.324400E-01, 2.480700E+00])
-    chi = numpy.zeros(7)
-    sigma_t = computeSigmaT(sigma_a, sigma_s, 7)
-
-    # Create datasets for each cross-section type
-    water.create_dataset('Total XS', data=sigma_t)
-    water.create_dataset('Absorption XS', data=sigma_a)
-    water.create_dataset('Scattering XS', data=sigma_s)
-    water.create_dataset('Fission XS', data=sigma_f)
-    water.create_dataset('Nu Fission XS', data=nu_sigma_f)
-    water.create_dataset('Chi', data=chi)
+    # Create a subgroup with datasets for each cross-section type per material
+    for i, name in enumerate(MATERIALS):
+        material = f.create_group(name)
 
+        for xs_type, data in xs.items():
+            material.create_dataset(xs_type, data=data[0, i])
 
-    # Close the hdf5 data file
-    f.close()
 
 
+def computeCrossSections(factors):
+    '''
+        This method applies the enrichment factors to the base C5G7 data
+        for any number of slider configurations at once. It takes in the
+        following arguments:
+
+        factors - an array of shape (6,) or (N, 6) with the uo2, mox1,
+                  mox2, mox3, poison and boron multipliers for each of
+                  N configurations (see writeMaterialsFile)
+
+        It returns a dictionary keyed by HDF5 dataset name. Each entry is
+        an array of shape (N, materials, groups), apart from the
+        'Scattering XS' which is (N, materials, groups**2) and flattened
+        in the layout expected by OpenMOC.
+    '''
+
+    factors = numpy.atleast_2d(numpy.asarray(factors, dtype=numpy.float64))
+    num_configs = factors.shape[0]
+
+    if factors.shape[1] != len(FACTORS):
+        raise ValueError('Expected %d enrichment factors per configuration '
+                         'but found %d' % (len(FACTORS), factors.shape[1]))
+
+    # Append a unit factor for the materials which are not manipulated
+    factors = numpy.hstack((factors, numpy.ones((num_configs, 1))))
+    fiss_mult = factors[:, FISSION_FACTOR, numpy.newaxis]
+    abs_mult = factors[:, ABSORPTION_FACTOR, numpy.newaxis]
+
+    base_sigma_a = C5G7_XS[:, REACTIONS.index('Absorption XS')]
+    base_sigma_f = C5G7_XS[:, REACTIONS.index('Fission XS')]
+    base_nu_sigma_f = C5G7_XS[:, REACTIONS.index('Nu Fission XS')]
+    base_chi = C5G7_XS[:, REACTIONS.index('Chi')]
+
+    # Increasing the enrichment increases fission and, by proxy, absorption
+    sigma_f = base_sigma_f * fiss_mult
+    nu_sigma_f = base_nu_sigma_f * fiss_mult
+    sigma_a = base_sigma_a * abs_mult + (fiss_mult - 1.0) * sigma_f
+
+    # The total xs matches the absorption plus the outscattering xs
+    sigma_t = computeSigmaT(sigma_a, C5G7_SCATTER, NUM_GROUPS)
+    for name, tabulated in TABULATED_TOTAL_XS.items():
+        sigma_t[:, MATERIALS.index(name)] = tabulated
 
-def computeSigmaT(sigma_a, sigma_s, num_groups):
+    shape = (num_configs, len(MATERIALS), NUM_GROUPS)
+    sigma_s = numpy.broadcast_to(C5G7_SCATTER.reshape(len(MATERIALS), -1),
+                                 (num_configs, len(MATERIALS), NUM_GROUPS**2))
+
+    return {'Total XS': sigma_t,
+            'Absorption XS': sigma_a,
+            'Scattering XS': sigma_s,
+            'Fission XS': sigma_f,
+            'Nu Fission XS': nu_sigma_f,
+            'Chi': numpy.broadcast_to(base_chi, shape)}
+
+
+def computeSigmaT(sigma_a, sigma_s, num_groups=None):
     '''
+        This method computes the total xs as the sum of the absorption and
+        outscattering xs for any number of materials and configurations in
+        a single reduction. It takes in the following arguments:
+
+        sigma_a    - an array of shape (..., G) of absorption xs
+        sigma_s    - an array of scattering matrices indexed by (origin,
+                     destination), either flattened with shape (..., G**2)
+                     as stored in the HDF5 file or with shape (..., G, G)
+        num_groups - the number of energy groups G (defaults to the last
+                     dimension of sigma_a)
+
+        The leading dimensions of both arrays are broadcast against each
+        other, so a (configs, materials, G, G) stack of scattering matrices
+        returns a (configs, materials, G) array of total xs.
     '''
-    
-    # Calculate total xs to accurately match the total absorption and scattering
-    # cross-sections based on the enrichment factors
-    sigma_t = numpy.zeros(num_groups)
-    sigma_t[:] = sigma_a[:]
 
-    for start in range(num_groups):
-        stop = num_groups**2 - num_groups + start + 1
-        sigma_t += sigma_s[start:stop:num_groups]
+    sigma_a = numpy.asarray(sigma_a, dtype=numpy.float64)
+    sigma_s = numpy.asarray(sigma_s, dtype=numpy.float64)
 
-    return sigma_t
+    if num_groups is None:
+        num_groups = sigma_a.shape[-1]
+
+    if sigma_a.shape[-1] != num_groups:
+        raise ValueError('Expected %d groups of absorption xs but found %d' % \
+                         (num_groups, sigma_a.shape[-1]))
+
+    # Reshape flattened scattering xs into (origin, destination) matrices
+    if sigma_s.ndim >= 2 and sigma_s.shape[-2:] == (num_groups, num_groups):
+        pass
+    elif sigma_s.shape[-1] == num_groups**2:
+        sigma_s = sigma_s.reshape(sigma_s.shape[:-1] + (num_groups, num_groups))
+    else:
+        raise ValueError('Scattering xs of shape %s is neither a flattened ' \
+                         '(..., %d) nor a (..., %d, %d) matrix layout' % \
+                         (sigma_s.shape, num_groups**2, num_groups, num_groups))
+
+    # Calculate total xs to accurately match the total absorption and scattering
+    # cross-sections based on the enrichment factors
+    return sigma_a + sigma_s.sum(axis=-1)
@@ -0,0 +1,542 @@
+'''
+    This file implements a 2D method of characteristics (MOC) solver in
+    NumPy for small versions of the Design-a-Reactor geometry, such as a
+    single pin cell or assembly, so that the transport solution can be
+    tested without the compiled OpenMOC library. It lays out cyclic tracks
+    and quadratures the same way as OpenMOC's TrackGenerator (with the
+    Tabuchi-Yamamoto polar quadrature), so that its keff and fluxes can be
+    checked against OpenMOC for the same number of azimuthal angles and
+    track spacing.
+
+    The pins are subdivided into the same rings and sectors as the pin
+    cells of design-a-reactor.py, and each segment sweep is vectorized over
+    all tracks, energy groups and polar angles at once. With reflective
+    boundaries, the source iteration is accelerated by rebalancing the group
+    fluxes across the whole geometry after each sweep.
+
+    Usage: python moc.py [materials HDF5 file]
+'''
+
+import sys
+import time
+import h5py
+import numpy as np
+import materials as c5g7
+import corebuilder
+
+
+# Tabuchi-Yamamoto polar quadrature with 3 polar angles in each hemisphere
+POLAR_SINES = np.array([0.166648, 0.537707, 0.932954])
+POLAR_WEIGHTS = np.array([0.046233, 0.283619, 0.670148])
+
+
+class MOCSolver(object):
+
+    def __init__(self, pin_map, xs, pins=corebuilder.PINS, num_azim=4,
+                 track_spacing=0.1, rings=3, sectors=8, boundary='reflective'):
+        '''
+        pin_map       - rows of pin codes, from the top (see corebuilder.py)
+        xs            - the materials data as returned by readMaterials
+        pins          - the material in each pin by pin code
+        num_azim      - the number of azimuthal angles in 2 pi (a multiple
+                        of 4)
+        track_spacing - the spacing between tracks (cm)
+        rings         - the number of equal volume rings in each pin
+        sectors       - the number of equal angle sectors in each pin and
+                        in each of the water rings around it
+        boundary      - 'reflective' or 'vacuum' on all sides
+        '''
+
+        if num_azim % 4:
+            raise ValueError('The number of azimuthal angles must be a ' \
+                             'multiple of 4 but is %d' % num_azim)
+
+        self.pin_map = np.array([list(row) for row in pin_map])
+        self.pins = pins
+        self.num_azim = num_azim
+        self.track_spacing = track_spacing
+        self.sectors = sectors
+        self.boundary = boundary
+
+        self.width = self.pin_map.shape[1] * corebuilder.PIN_PITCH
+        self.height = self.pin_map.shape[0] * corebuilder.PIN_PITCH
+
+        # The radii of the equal volume rings in the pin and of the water
+        # rings around it, which divide a pin cell into len(radii)+1 rings
+        pin_radius = corebuilder.PIN_RADII[0]
+        self.radii = np.append(pin_radius * np.sqrt(np.arange(1., rings) /
+                                                    rings),
+                               corebuilder.PIN_RADII)
+        self.fuel_rings = rings
+
+        self.initializeFSRs(xs)
+        self.generateTracks()
+        self.segmentize()
+
+        self.keff = None
+        self.fluxes = None
+        self.num_iterations = 0
+
+
+    def initializeFSRs(self, xs):
+        '''
+        Numbers the flat source regions (FSRs) pin by pin and sets the
+        cross-sections in each FSR, indexed by (FSR, group).
+        '''
+
+        regions_per_pin = (len(self.radii) + 1) * self.sectors
+        water = xs['Water']
+
+        # Water pins (moderator cells) are a single FSR
+        is_water = (self.pin_map == corebuilder.WATER).ravel()
+        num_regions = np.where(is_water, 1, regions_per_pin)
+        self.pin_offsets = np.append(0, np.cumsum(num_regions))
+        self.num_fsrs = self.pin_offsets[-1]
+
+        fsr_materials = []
+        for code in self.pin_map.ravel():
+            if code == corebuilder.WATER:
+                fsr_materials.append(water)
+                continue
+
+            for ring in range(len(self.radii) + 1):
+                if ring < self.fuel_rings:
+                    data = xs[self.pins[code]]
+                else:
+                    data = water
+                fsr_materials.extend([data] * self.sectors)
+
+        self.sigma_t = np.array([data['Total XS'] for data in fsr_materials])
+        self.nu_sigma_f = np.array([data['Nu Fission XS']
+                                    for data in fsr_materials])
+        self.chi = np.array([data['Chi'] for data in fsr_materials])
+        self.num_groups = self.sigma_t.shape[1]
+        self.sigma_s = np.array([data['Scattering XS'] for data in
+                                 fsr_materials]).reshape(
+            self.num_fsrs, self.num_groups, self.num_groups)
+
+
+    def generateTracks(self):
+        '''
+        Lays out cyclic tracks across the geometry for each azimuthal angle
+        in [0, pi), adjusting the angles and spacings so that the tracks of
+        complementary angles meet at the boundaries, as OpenMOC does.
+        '''
+
+        num_quadrant = self.num_azim / 4
+        phis = 2. * np.pi / self.num_azim * (np.arange(num_quadrant) + 0.5)
+
+        nx = (self.width / self.track_spacing * np.abs(np.sin(phis))).astype(
+            int) + 1
+        ny = (self.height / self.track_spacing * np.abs(np.cos(phis))).astype(
+            int) + 1
+        phis = np.arctan(self.height * nx / (self.width * ny))
+        spacings = self.width / nx * np.sin(phis)
+
+        # The azimuthal weights are the fraction of [0, pi) nearest each
+        # angle, shared by the angle phi and its complement pi - phi
+        bounds = np.concatenate(([0.], (phis[1:] + phis[:-1]) / 2.,
+                                 [np.pi / 2.]))
+        weights = np.diff(bounds) / np.pi
+
+        starts, directions, track_spacings, track_weights = [], [], [], []
+
+        for phi, nx_a, ny_a, spacing, weight in \
+                zip(phis, nx, ny, spacings, weights):
+            dx = self.width / nx_a
+            dy = self.height / ny_a
+
+            for angle, x_edge in [(phi, 0.), (np.pi - phi, self.width)]:
+                direction = (np.cos(angle), np.sin(angle))
+
+                # Tracks start on the bottom edge and on the left (or, for
+                # angles above pi / 2, right) edge
+                for i in range(nx_a):
+                    starts.append((dx * (i + 0.5), 0.))
+                for j in range(ny_a):
+                    starts.append((x_edge, dy * (j + 0.5)))
+
+                count = nx_a + ny_a
+                directions.extend([direction] * count)
+                track_spacings.extend([spacing] * count)
+                track_weights.extend([weight] * count)
+
+        self.starts = np.array(starts)
+        self.directions = np.array(directions)
+        self.track_spacings = np.array(track_spacings)
+        self.azim_weights = np.array(track_weights)
+        self.num_tracks = len(starts)
+
+        # The distance along each track to the boundary
+        with np.errstate(divide='ignore'):
+            tx = np.where(self.directions[:,0] > 0.,
+                          (self.width - self.starts[:,0]) /
+                          self.directions[:,0],
+                          -self.starts[:,0] / self.directions[:,0])
+            ty = (self.height - self.starts[:,1]) / self.directions[:,1]
+        self.lengths = np.minimum(tx, ty)
+        self.ends = self.starts + self.lengths[:,np.newaxis] * self.directions
+
+        self.linkTracks()
+
+
+    def linkTracks(self):
+        '''
+        Finds the track and direction (0 forward, 1 backward) whose incoming
+        angular flux is the outgoing angular flux of each track in each
+        direction, reflected at the boundary.
+        '''
+
+        def key(point, direction):
+            return tuple(np.round(np.append(point, direction), 6))
+
+        # Tracks start where they are traversed forward and end where they
+        # are traversed backward
+        entries = {}
+        for track in range(self.num_tracks):
+            entries[key(self.starts[track], self.directions[track])] = \
+                (track, 0)
+            entries[key(self.ends[track], -self.directions[track])] = \
+                (track, 1)
+
+        self.links = np.zeros((self.num_tracks, 2), dtype=np.int64)
+
+        for track in range(self.num_tracks):
+            for sense, point, direction in \
+                    [(0, self.ends[track], self.directions[track]),
+                     (1, self.starts[track], -self.directions[track])]:
+
+                # Reflect the direction off the side which the track leaves
+                reflected = direction.copy()
+                if np.isclose(point[0], 0.) or np.isclose(point[0],
+                                                          self.width):
+                    reflected[0] *= -1.
+                if np.isclose(point[1], 0.) or np.isclose(point[1],
+                                                          self.height):
+                    reflected[1] *= -1.
+
+                next_track, next_sense = entries[key(point, reflected)]
+                self.links[track, sense] = 2 * next_track + next_sense
+
+
+    def segmentize(self):
+        '''
+        Ray traces each track through the pin cells, rings and sectors and
+        stores the FSR and length of its segments in (track, segment)
+        arrays padded with zero length segments, with the tracks sorted by
+        decreasing number of segments.
+        '''
+
+        pitch = corebuilder.PIN_PITCH
+        num_rows, num_cols = self.pin_map.shape
+        rows, cols = np.mgrid[0:num_rows, 0:num_cols]
+        centers = np.column_stack((((cols + 0.5) * pitch).ravel(),
+                                   ((num_rows - rows - 0.5) * pitch).ravel()))
+        is_fuel = (self.pin_map != corebuilder.WATER).ravel()
+
+        # Lines through the pin centers separating the sectors
+        sector_angles = np.arange(self.sectors / 2) * 2. * np.pi / self.sectors
+        sector_lines = np.column_stack((np.cos(sector_angles),
+                                        np.sin(sector_angles)))
+
+        fsrs, lengths = [], []
+
+        for track in range(self.num_tracks):
+            start = self.starts[track]
+            direction = self.directions[track]
+            length = self.lengths[track]
+            crossings = [np.array([0., length])]
+
+            # Pin cell boundaries
+            if abs(direction[0]) > 1E-12:
+                crossings.append((np.arange(num_cols + 1) * pitch - start[0]) /
+                                 direction[0])
+            if abs(direction[1]) > 1E-12:
+                crossings.append((np.arange(num_rows + 1) * pitch - start[1]) /
+                                 direction[1])
+
+            # Circles around each pin
+            offsets = start - centers[is_fuel]
+            b = offsets.dot(direction)
+            c = (offsets**2).sum(axis=1)
+            discriminant = b[:,np.newaxis]**2 - c[:,np.newaxis] + self.radii**2
+            hits = discriminant > 0.
+            root = np.sqrt(discriminant[hits])
+            b = np.broadcast_to(b[:,np.newaxis], discriminant.shape)[hits]
+            crossings.extend([-b - root, -b + root])
+
+            # Sector lines within each pin cell
+            cross = direction[0] * sector_lines[:,1] - \
+                    direction[1] * sector_lines[:,0]
+            valid = np.abs(cross) > 1E-12
+            t = (offsets[:,0,np.newaxis] * sector_lines[valid,1] -
+                 offsets[:,1,np.newaxis] * sector_lines[valid,0]) / \
+                -cross[valid]
+            points = start + t[...,np.newaxis] * direction - \
+                     centers[is_fuel][:,np.newaxis]
+            inside = (np.abs(points) < pitch / 2.).all(axis=-1)
+            crossings.append(t[inside])
+
+            t = np.unique(np.concatenate(crossings))
+            t = t[(t >= 0.) & (t <= length)]
+            segment_lengths = np.diff(t)
+            keep = segment_lengths > 1E-10
+            midpoints = start + ((t[1:] + t[:-1]) / 2.)[keep,np.newaxis] * \
+                        direction
+
+            fsrs.append(self.findFSRs(midpoints))
+            lengths.append(segment_lengths[keep])
+
+        self.num_segments = np.array([len(l) for l in lengths])
+        self.order = np.argsort(-self.num_segments, kind='mergesort')
+        max_segments = self.num_segments.max()
+
+        # Padding segments point at an extra FSR which is never used
+        self.segment_fsrs = np.full((self.num_tracks, 2, max_segments),
+                                    self.num_fsrs, dtype=np.int64)
+        self.segment_lengths = np.zeros((self.num_tracks, 2, max_segments))
+
+        for track in range(self.num_tracks):
+            n = self.num_segments[track]
+            self.segment_fsrs[track, 0, :n] = fsrs[track]
+            self.segment_fsrs[track, 1, :n] = fsrs[track][::-1]
+            self.segment_lengths[track, 0, :n] = lengths[track]
+            self.segment_lengths[track, 1, :n] = lengths[track][::-1]
+
+        # The number of tracks with more than k segments, in sorted order
+        self.active = (self.num_segments[self.order][:,np.newaxis] >
+                       np.arange(max_segments)).sum(axis=0)
+
+        # The areas of the FSRs integrated along the tracks
+        weights = (self.track_spacings * self.azim_weights)[:,np.newaxis]
+        self.areas = np.bincount(self.segment_fsrs[:,0].ravel(),
+                                 (weights * self.segment_lengths[:,0]).ravel(),
+                                 minlength=self.num_fsrs+1)[:self.num_fsrs]
+
+
+    def findFSRs(self, points):
+        '''
+        Returns the FSR containing each of an (N, 2) array of points.
+        '''
+
+        pitch = corebuilder.PIN_PITCH
+        num_rows, num_cols = self.pin_map.shape
+
+        cols = np.clip((points[:,0] // pitch).astype(int), 0, num_cols-1)
+        rows = np.clip(num_rows - 1 - (points[:,1] // pitch).astype(int),
+                       0, num_rows-1)
+        pins = rows * num_cols + cols
+
+        offsets = points - np.column_stack(((cols + 0.5) * pitch,
+                                            (num_rows - rows - 0.5) * pitch))
+        rings = np.searchsorted(self.radii, np.hypot(offsets[:,0],
+                                                     offsets[:,1]))
+        angles = np.arctan2(offsets[:,1], offsets[:,0]) % (2. * np.pi)
+        sectors = np.minimum((angles / (2. * np.pi / self.sectors)).astype(int),
+                             self.sectors-1)
+
+        fsrs = self.pin_offsets[pins] + rings * self.sectors + sectors
+        is_water = self.pin_map.ravel()[pins] == corebuilder.WATER
+        fsrs[is_water] = self.pin_offsets[pins[is_water]]
+
+        return fsrs
+
+
+    def sweep(self, reduced_source, boundary_fluxes):
+        '''
+        Sweeps every track in both directions with the reduced source (the
+        source divided by the total xs) in each FSR and the incoming angular
+        fluxes from the previous sweep. Returns the angular flux tallies in
+        each FSR, indexed by (FSR, group), and the outgoing angular fluxes
+        indexed by (2 * track + direction, group, polar angle).
+        '''
+
+        num_polar = len(POLAR_SINES)
+        order = self.order
+        sigma_t = np.vstack((self.sigma_t, np.ones(self.num_groups)))
+        source = np.vstack((reduced_source, np.zeros(self.num_groups)))
+
+        # Each direction of each track tallies with its azimuthal weight,
+        # its spacing and the polar weights (2 pi for both hemispheres)
+        polar = 2. * np.pi * POLAR_WEIGHTS * POLAR_SINES
+        weights = (self.azim_weights * self.track_spacings)[order]
+        tallies = np.zeros((self.num_fsrs + 1) * self.num_groups)
+        groups = np.arange(self.num_groups)
+
+        outgoing = np.zeros((self.num_tracks, 2, self.num_groups, num_polar))
+
+        for sense in range(2):
+            fsrs = self.segment_fsrs[order, sense]
+            lengths = self.segment_lengths[order, sense]
+
+            if self.boundary == 'reflective':
+                psi = boundary_fluxes[order, sense].copy()
+            else:
+                psi = np.zeros((self.num_tracks, self.num_groups, num_polar))
+
+            for k, num_active in enumerate(self.active):
+                fsr = fsrs[:num_active, k]
+                tau = sigma_t[fsr] * lengths[:num_active, k, np.newaxis]
+                attenuation = 1. - np.exp(-tau[...,np.newaxis] / POLAR_SINES)
+                delta = (psi[:num_active] - source[fsr][...,np.newaxis]) * \
+                        attenuation
+                psi[:num_active] -= delta
+
+                index = (fsr[:,np.newaxis] * self.num_groups + groups).ravel()
+                tallies += np.bincount(
+                    index, (delta.dot(polar) *
+                            weights[:num_active,np.newaxis]).ravel(),
+                    minlength=tallies.size)
+
+            outgoing[order, sense] = psi
+
+        tallies = tallies.reshape(-1, self.num_groups)[:self.num_fsrs]
+
+        # The incoming fluxes for the next sweep are the reflected outgoing
+        # fluxes of the linked tracks
+        incoming = np.empty_like(outgoing).reshape(-1, self.num_groups,
+                                                   num_polar)
+        incoming[self.links.ravel()] = outgoing.reshape(incoming.shape)
+
+        return tallies, incoming.reshape(outgoing.shape)
+
+
+    def rebalance(self, phi):
+        '''
+        Returns the factors which scale the (FSR, group) array of scalar
+        fluxes in each group to balance the removal and the scattering and
+        fission sources across the whole geometry (without leakage), and
+        keff for the rebalanced fluxes.
+        '''
+
+        weighted = phi * self.areas[:,np.newaxis]
+
+        # Reaction rates in each group, or from (origin) group h into group g
+        removal = np.diag((self.sigma_t * weighted).sum(axis=0))
+        scatter = np.einsum('ihg,ih->gh', self.sigma_s, weighted)
+        fission = np.einsum('ig,ih->gh', self.chi, self.nu_sigma_f * weighted)
+
+        eigenvalues, eigenvectors = np.linalg.eig(
+            np.linalg.solve(removal - scatter, fission))
+        fundamental = np.argmax(eigenvalues.real)
+        factors = np.abs(eigenvectors[:,fundamental].real)
+
+        # Keep the total fission production
+        production = (self.nu_sigma_f * weighted).sum(axis=0)
+        factors *= production.sum() / production.dot(factors)
+
+        return factors, eigenvalues[fundamental].real
+
+
+    def solve(self, tolerance=1E-5, max_iters=1000, keff=1., fluxes=None):
+        '''
+        Converges the source by power iteration, warm-started from a
+        previous keff and (FSR, group) array of scalar fluxes if given.
+        Returns keff and the (FSR, group) array of scalar fluxes, normalized
+        to a mean fission source of one in the fissile FSRs.
+        '''
+
+        if fluxes is None:
+            phi = np.ones((self.num_fsrs, self.num_groups))
+        else:
+            phi = np.array(fluxes, dtype=np.float64)
+
+        boundary_fluxes = np.zeros((self.num_tracks, 2, self.num_groups,
+                                    len(POLAR_SINES)))
+
+        production = (self.nu_sigma_f * phi).sum(axis=1)
+        self.num_iterations = 0
+
+        while self.num_iterations < max_iters:
+            scatter = np.einsum('ihg,ih->ig', self.sigma_s, phi)
+            fission = self.chi * production[:,np.newaxis] / keff
+            reduced_source = (scatter + fission) / (4. * np.pi * self.sigma_t)
+
+            tallies, boundary_fluxes = self.sweep(reduced_source,
+                                                  boundary_fluxes)
+            phi = 4. * np.pi * reduced_source + \
+                  tallies / (self.sigma_t * self.areas[:,np.newaxis])
+
+            # Without leakage, rebalance the group fluxes across the whole
+            # geometry, which converges the spectrum and keff much faster
+            # than the source iteration alone
+            if self.boundary == 'reflective':
+                factors, new_keff = self.rebalance(phi)
+                phi *= factors
+                boundary_fluxes *= factors[:,np.newaxis]
+            else:
+                new_keff = keff * self.areas.dot(
+                    (self.nu_sigma_f * phi).sum(axis=1)) / \
+                    self.areas.dot(production)
+
+            new_production = (self.nu_sigma_f * phi).sum(axis=1)
+            self.num_iterations += 1
+
+            # RMS relative change in the fission source of the fissile FSRs
+            fissile = production > 0.
+            old = production[fissile] / self.areas.dot(production)
+            new = new_production[fissile] / self.areas.dot(new_production)
+            residual = np.sqrt(np.mean(((new - old) / new)**2))
+
+            converged = residual < tolerance and \
+                        abs(new_keff - keff) < tolerance
+            keff, production = new_keff, new_production
+
+            if converged:
+                break
+
+        # Normalize to a mean fission source of one in the fissile FSRs
+        fissile = production > 0.
+        phi *= self.areas[fissile].sum() / self.areas.dot(production)
+
+        self.keff = keff
+        self.fluxes = phi
+
+        return self.keff, self.fluxes
+
+
+def pinCell(xs, code='U', **kwargs):
+    '''
+    Returns an MOC solver for a single pin cell with reflective boundaries.
+    '''
+
+    return MOCSolver([code], xs, **kwargs)
+
+
+def assembly(xs, code='U', **kwargs):
+    '''
+    Returns an MOC solver for a single assembly of the Design-a-Reactor core
+    with reflective boundaries.
+    '''
+
+    return MOCSolver(corebuilder.ASSEMBLIES[code], xs, **kwargs)
+
+
+def main():
+
+    if len(sys.argv) > 1:
+        filename = sys.argv[1]
+    else:
+        filename = 'design-a-reactor-materials.hdf5'
+
+    f = h5py.File(filename, 'r')
+    xs = c5g7.readMaterials(f)
+    f.close()
+
+    for name, solver in [('UO2 pin cell', lambda: pinCell(xs, 'U',
+                                                          num_azim=16,
+                                                          track_spacing=0.05)),
+                         ('UO2 assembly', lambda: assembly(xs, 'U'))]:
+        start = time.time()
+        solver = solver()
+        keff, fluxes = solver.solve()
+
+        print '%s: k_eff = %f (%d FSRs, %d tracks, %d segments, ' \
+              '%d iterations, %.2f sec)' % \
+              (name, keff, solver.num_fsrs, solver.num_tracks,
+               solver.num_segments.sum(), solver.num_iterations,
+               time.time() - start)
+
+
+if __name__ == '__main__':
+    main()
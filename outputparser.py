@@ -0,0 +1,208 @@
+'''
+    This file parses OpenMOC's output into a run record: the keff and
+    residual of each source iteration, the timing report (total time, time
+    per unknown, per iteration and per segment integration) and the track,
+    segment, FSR and CMFD mesh cell counts. The parser consumes one line at
+    a time, so it can follow a solver's output while it runs as well as
+    read a finished output file. Run records are appended to a telemetry
+    store to compare solver throughput across machines and settings.
+
+    Usage: python outputparser.py [telemetry file]
+
+    prints the mean solver throughput of the runs in the telemetry store
+    for each host and set of solver options.
+'''
+
+import os
+import re
+import sys
+import json
+import time
+import socket
+import collections
+import numpy as np
+
+
+# An OpenMOC source iteration log line, e.g.
+# [  NORMAL ]  Iteration 2: 	k_eff = 0.797371	res = 3.858E+01
+ITERATION_PATTERN = re.compile(r'Iteration (\d+):\s+k_eff = ([-+.0-9Ee]+)' \
+                               r'\s+res = ([-+.0-9Ee]+)')
+
+NUMBER = r'([-+.0-9Ee]+)'
+
+# The record field of each single valued line of the output
+PATTERNS = [('total_time', re.compile(r'Total time to solution\.+' + NUMBER)),
+            ('time_per_unknown',
+             re.compile(r'Solution time per unknown\.+' + NUMBER)),
+            ('time_per_iteration',
+             re.compile(r'Solution time per iteration\.+' + NUMBER)),
+            ('time_per_segment',
+             re.compile(r'Integration time per segment integration\.+' +
+                        NUMBER)),
+            ('num_fsrs', re.compile(r'Number of flat source regions: (\d+)')),
+            ('num_mesh_cells', re.compile(r'Number of mesh cells: (\d+)'))]
+
+# The row of track, segment and FSR counts below the timing report
+COUNTS_PATTERN = re.compile(r'RESULT \]\s+(\d+)\s+(\d+)\s+(\d+)\s*$')
+
+RunRecord = collections.namedtuple('RunRecord',
+    ['keff', 'keffs', 'residuals', 'num_iterations', 'total_time',
+     'time_per_unknown', 'time_per_iteration', 'time_per_segment',
+     'num_tracks', 'num_segments', 'num_fsrs', 'num_mesh_cells',
+     'host', 'timestamp', 'options', 'factors'])
+
+
+def parseIteration(line):
+    '''
+    Returns the iteration number, keff and residual in an OpenMOC source
+    iteration log line, or None for any other line.
+    '''
+
+    match = ITERATION_PATTERN.search(line)
+    if match is None:
+        return None
+
+    return int(match.group(1)), float(match.group(2)), float(match.group(3))
+
+
+class OutputParser(object):
+
+    def __init__(self):
+
+        self.keffs = []
+        self.residuals = []
+        self.values = {}
+
+
+    def feed(self, line):
+        '''
+        Parses one line of OpenMOC output. Returns the iteration number, keff
+        and residual if the line reports a source iteration, or None.
+        '''
+
+        iteration = parseIteration(line)
+
+        if iteration is not None:
+            self.keffs.append(iteration[1])
+            self.residuals.append(iteration[2])
+            return iteration
+
+        for field, pattern in PATTERNS:
+            match = pattern.search(line)
+            if match is not None:
+                number = match.group(1)
+                self.values[field] = int(number) if number.isdigit() \
+                                     else float(number)
+                return None
+
+        match = COUNTS_PATTERN.search(line)
+        if match is not None:
+            self.values['num_tracks'] = int(match.group(1))
+            self.values['num_segments'] = int(match.group(2))
+            self.values['num_fsrs'] = int(match.group(3))
+
+        return None
+
+
+    def record(self, host=None, options='', factors=None):
+        '''
+        Returns the run record of the output parsed so far, for a run of the
+        solver options and enrichment factors on a host (this machine by
+        default). Values missing from the output are None.
+        '''
+
+        values = dict((field, None) for field in RunRecord._fields)
+        values.update(self.values)
+        values.update(keff=self.keffs[-1] if self.keffs else None,
+                      keffs=list(self.keffs),
+                      residuals=list(self.residuals),
+                      num_iterations=len(self.keffs),
+                      host=host or socket.gethostname(),
+                      timestamp=time.time(), options=options,
+                      factors=list(factors) if factors is not None else None)
+
+        return RunRecord(**values)
+
+
+def parseOutput(lines, host=None, options='', factors=None):
+    '''
+    Returns the run record of the OpenMOC output in an iterable of lines,
+    such as an open output file (see OutputParser.record).
+    '''
+
+    parser = OutputParser()
+    for line in lines:
+        parser.feed(line)
+
+    return parser.record(host, options, factors)
+
+
+class TelemetryStore(object):
+    '''
+    An append-only store of run records, one JSON object per line, which
+    any number of processes can append to.
+    '''
+
+    def __init__(self, filename='telemetry.jsonl'):
+        self.filename = filename
+
+
+    def append(self, record):
+        line = json.dumps(record._asdict(), sort_keys=True) + '\n'
+
+        # Each line goes to the end of the file in a single write(2) on an
+        # O_APPEND descriptor, so that lines appended concurrently by other
+        # processes never interleave. A buffered file object may split the
+        # line over several writes.
+        fd = os.open(self.filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                     0644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+
+    def records(self):
+        '''
+        Returns the run records in the store.
+        '''
+
+        records = []
+
+        try:
+            with open(self.filename, 'r') as fh:
+                for line in fh:
+                    values = json.loads(line)
+                    records.append(RunRecord(**dict((field, values.get(field))
+                                             for field in RunRecord._fields)))
+        except IOError:
+            pass
+
+        return records
+
+
+def main():
+
+    filename = sys.argv[1] if len(sys.argv) > 1 else 'telemetry.jsonl'
+    records = [record for record in TelemetryStore(filename).records()
+               if record.time_per_segment is not None]
+
+    groups = collections.defaultdict(list)
+    for record in records:
+        groups[(record.host, record.options)].append(record)
+
+    print '%-20s %-32s %5s %10s %12s %12s' % \
+          ('Host', 'Options', 'Runs', 'Time (sec)', 'Per segment',
+           'Segments/sec')
+    print '-' * 96
+
+    for (host, options), group in sorted(groups.items()):
+        total_time = np.mean([record.total_time for record in group])
+        per_segment = np.mean([record.time_per_segment for record in group])
+        print '%-20s %-32s %5d %10.2f %12.3E %12.3E' % \
+              (host, options, len(group), total_time, per_segment,
+               1. / per_segment)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+'''
+    This file estimates keff for new enrichment factors by first-order
+    perturbation theory, without solving again. The sliders only rescale
+    the fission and absorption cross-sections, so the change in the
+    eigenvalue is an inner product of the cross-section changes with the
+    forward and adjoint fluxes of a reference design. The fluxes are solved
+    once with the diffusion solver and reduced to moments per material and
+    group, so that each estimate costs a few hundred multiplications and
+    many configurations can be estimated at once. Given the keff of the
+    reference design from OpenMOC, the estimated changes are applied to it
+    rather than to the less accurate diffusion keff.
+
+    Usage: python perturbation.py [uo2 mox1 mox2 mox3 poison boron]
+
+    prints the reference keff and the sensitivity of keff to each slider for
+    the given enrichment factors (the defaults of the GUI sliders otherwise),
+    and compares estimated and solved keffs for a few nearby designs.
+'''
+
+import sys
+import time
+import numpy as np
+import materials as c5g7
+import corebuilder
+import critsearch
+
+
+class PerturbationEstimator(object):
+
+    def __init__(self, factors=critsearch.DEFAULT_FACTORS, keff=None,
+                 solver=None):
+        '''
+        factors - the enrichment factors (uo2, mox1, mox2, mox3, poison,
+                  boron) of the reference design
+        keff    - the keff of the reference design from OpenMOC, or None to
+                  estimate from the diffusion keff
+        solver  - the diffusion solver to solve the reference design with
+                  (defaults to the standard Design-a-Reactor core)
+        '''
+
+        import diffusion
+
+        if solver is None:
+            solver = diffusion.DiffusionSolver()
+
+        self.solver = solver
+        self.setReference(factors, keff)
+
+
+    def setReference(self, factors, keff=None):
+        '''
+        Solves the forward and adjoint problems for the reference enrichment
+        factors and reduces the fluxes to the moments of each material. The
+        estimates are the reference keff from OpenMOC plus the estimated
+        change in keff if one is given, and from the diffusion keff if not.
+        '''
+
+        self.factors = np.asarray(factors, dtype=np.float64)
+        self.xs = c5g7.computeCrossSections(self.factors)
+
+        solver = self.solver
+        solver.setMaterialsImage(c5g7.createMaterialsImage(*self.factors))
+        self.diffusion_keff, fluxes = solver.solve()
+        solver.solve(adjoint=True)
+
+        self.keff = self.diffusion_keff if keff is None else float(keff)
+
+        num_groups = solver.num_groups
+        phi = fluxes.reshape(-1, num_groups)
+        adjoint = solver.adjoint_fluxes.reshape(-1, num_groups)
+
+        # The volume fraction of each material in each mesh cell, where the
+        # pins are homogenized with their moderator as in the solver
+        codes = solver.pins.ravel()
+        water = c5g7.MATERIALS.index('Water')
+        weights = np.zeros((len(c5g7.MATERIALS), codes.size))
+        chi = np.zeros((codes.size, num_groups))
+
+        for code, name in solver.core.pins.items():
+            cells = codes == code
+            material = c5g7.MATERIALS.index(name)
+            weights[material, cells] = solver.pin_fraction
+            weights[water, cells] = 1. - solver.pin_fraction
+            chi[cells] = solver.xs[name]['Chi']
+
+        weights[water, codes == corebuilder.WATER] = 1.
+
+        # The removal moments <adjoint, phi> and fission moments
+        # <chi . adjoint, phi> of each material and group
+        self.removal_moments = weights.dot(adjoint * phi)
+        self.fission_moments = weights.dot((chi * adjoint).sum(axis=1)[:,None]
+                                           * phi)
+
+        # The fission production <adjoint, F phi> of the reference design
+        self.production = (self.xs['Nu Fission XS'][0] *
+                           self.fission_moments).sum()
+
+
+    def estimate(self, factors):
+        '''
+        Returns the estimated keff for the enrichment factors, given either
+        as one configuration of shape (6,) or as N configurations of shape
+        (N, 6), where the estimates are an array of shape (N,).
+        '''
+
+        factors = np.asarray(factors, dtype=np.float64)
+        xs = c5g7.computeCrossSections(factors)
+
+        # The diffusion coefficients are held at their reference values, so
+        # only the total and nu-fission xs of the loss and fission operators
+        # are perturbed
+        delta_total = xs['Total XS'] - self.xs['Total XS']
+        delta_fission = xs['Nu Fission XS'] - self.xs['Nu Fission XS']
+
+        removal = np.einsum('nmg,mg->n', delta_total, self.removal_moments)
+        fission = np.einsum('nmg,mg->n', delta_fission, self.fission_moments)
+
+        # The first-order change in the eigenvalue 1/k of M phi = 1/k F phi,
+        # applied to the reference keff as a change in keff
+        reference = self.diffusion_keff
+        eigenvalue = 1. / reference + \
+                     (removal - fission / reference) / self.production
+        keffs = self.keff + (1. / eigenvalue - reference)
+
+        if factors.ndim == 1:
+            return float(keffs[0])
+        else:
+            return keffs
+
+
+    def sensitivities(self, factors=None):
+        '''
+        Returns the relative sensitivity (factor / keff) dkeff / dfactor of
+        the estimated keff to each enrichment factor, at the reference
+        factors unless others are given.
+        '''
+
+        if factors is None:
+            factors = self.factors
+
+        factors = np.asarray(factors, dtype=np.float64)
+
+        # The cross-sections are at most quadratic in the factors, so central
+        # differences of the estimate are exact up to round-off
+        steps = 1E-3 * np.maximum(np.abs(factors), 1.) * np.eye(len(factors))
+        keffs = self.estimate(np.vstack((factors + steps, factors - steps)))
+        derivatives = (keffs[:len(factors)] - keffs[len(factors):]) / \
+                      (2. * steps.diagonal())
+
+        return factors * derivatives / self.estimate(factors)
+
+
+def main():
+
+    if len(sys.argv) > 1:
+        factors = np.array([float(factor) for factor in sys.argv[1:]])
+    else:
+        factors = np.array(critsearch.DEFAULT_FACTORS)
+
+    start = time.time()
+    estimator = PerturbationEstimator(factors)
+    print 'Reference k_eff = %f (forward and adjoint in %.3f sec)' % \
+          (estimator.keff, time.time() - start)
+
+    print 'Sensitivities (factor / k_eff) dk_eff / dfactor:'
+    for name, sensitivity in zip(c5g7.FACTORS, estimator.sensitivities()):
+        print '  %-6s %+f' % (name, sensitivity)
+
+    # Compare the estimates with solves for a few nearby designs
+    changes = np.array([0.98, 0.95, 1.05, 1.02, 0.9, 1.1])
+    designs = [factors * np.where(np.arange(6) == i, changes[i], 1.)
+               for i in range(6)] + [factors * changes]
+
+    start = time.time()
+    estimates = estimator.estimate(np.array(designs))
+    estimate_time = time.time() - start
+
+    solve = critsearch.DiffusionKeff()
+    print '%-44s %9s %9s %9s' % ('Factors', 'Estimate', 'Solved', 'Error')
+
+    for design, estimate in zip(designs, estimates):
+        keff = solve(design)
+        print '%-44s %9f %9f %6.0f pcm' % \
+              (' '.join('%.3f' % factor for factor in design), estimate, keff,
+               1E5 * (estimate - keff))
+
+    print 'Estimated %d designs in %.2f msec' % \
+          (len(designs), 1E3 * estimate_time)
+
+
+if __name__ == '__main__':
+    main()
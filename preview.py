@@ -0,0 +1,99 @@
+'''
+    This file estimates the multiplication factor for a set of enrichment
+    factors from previous simulation results without running the solver.
+    A linear response surface is fit to the cached (factors -> keff) points
+    and the residuals are interpolated by inverse distance weighting, so
+    that the estimate reproduces every real run exactly. The confidence in
+    an estimate decays with the distance to the nearest real run.
+'''
+
+import numpy as np
+
+
+def verdict(keff):
+    '''
+    Returns whether a reactor with multiplication factor keff is critical,
+    sub-critical or super-critical.
+    '''
+
+    if abs(keff - 1.0) < 1E-4:
+        return 'Critical'
+    elif keff < 1.0:
+        return 'Sub-critical'
+    else:
+        return 'Super-critical'
+
+
+class KeffPreview(object):
+
+    def __init__(self, records=(), options=None, length_scale=0.1):
+        '''
+        records      - run records with 'factors' and 'keffs' entries, such
+                       as those returned by ResultCache.records()
+        options      - the solver options of the runs to estimate from, or
+                       None to estimate from every run
+        length_scale - the distance in enrichment factor space over which
+                       the confidence in an estimate falls by a factor e
+        '''
+
+        self.length_scale = length_scale
+        self.fit(records, options)
+
+
+    def fit(self, records, options=None):
+        '''
+        Fits the response surface to the final keff of each run record with
+        the solver options, or of every run record if options is None. Runs
+        with other options, and the coarse previews of progressive runs,
+        converge to a different keff and would bias the estimates.
+        '''
+
+        records = [record for record in records if record['keffs'] and
+                   not record.get('coarse') and
+                   (options is None or record.get('options') == options)]
+
+        self.points = np.array([record['factors'] for record in records],
+                               dtype=np.float64).reshape(-1, 6)
+        self.keffs = np.array([record['keffs'][-1] for record in records],
+                              dtype=np.float64)
+
+        # A linear response surface needs at least one point per coefficient
+        if self.keffs.size > self.points.shape[1]:
+            basis = np.hstack((np.ones((self.keffs.size, 1)), self.points))
+            self.coeffs = np.linalg.lstsq(basis, self.keffs, rcond=-1)[0]
+            self.residuals = self.keffs - basis.dot(self.coeffs)
+        else:
+            self.coeffs = None
+            self.residuals = self.keffs
+
+
+    def estimate(self, factors):
+        '''
+        Returns the estimated keff and a confidence between 0 and 1 for the
+        enrichment factors (uo2, mox1, mox2, mox3, poison, boron), or None
+        for both if there are no previous runs to estimate from.
+        '''
+
+        if self.keffs.size == 0:
+            return None, None
+
+        factors = np.asarray(factors, dtype=np.float64)
+        distances = np.sqrt(((self.points - factors)**2).sum(axis=1))
+        nearest = distances.argmin()
+
+        # Interpolate the residuals (or the keffs themselves, without a
+        # response surface) by inverse distance weighting
+        if distances[nearest] == 0.:
+            correction = self.residuals[nearest]
+        else:
+            weights = 1. / distances**2
+            correction = weights.dot(self.residuals) / weights.sum()
+
+        if self.coeffs is None:
+            keff = correction
+        else:
+            keff = self.coeffs[0] + self.coeffs[1:].dot(factors) + correction
+
+        confidence = np.exp(-distances[nearest] / self.length_scale)
+
+        return keff, confidence
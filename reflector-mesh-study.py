@@ -0,0 +1,84 @@
+'''
+    This script trades the number of flat source regions in the reflector
+    against accuracy and solve time. It runs design-a-reactor.py with each
+    reflector mesh and reports the FSR count, timing and k_eff of each run
+    against the current fine (10 x 10) mesh.
+
+    Usage: python reflector-mesh-study.py [OpenMOC options]
+
+    The OpenMOC options (e.g. '-a 16 -t 8 --tolerance=1E-5') are passed on to
+    every run, and the report is also written to reflector-mesh-study.txt.
+'''
+
+import sys
+import time
+import subprocess
+import outputparser
+
+
+# The reference mesh first, then uniformly coarser and graded meshes
+REFLECTOR_MESHES = ['10', '5', '3', '2', '1',
+                    '10,10,5,5,2,2,1',
+                    '5,5,3,3,2,2,1',
+                    '3,2,1']
+
+
+def runSimulation(reflector_mesh, options):
+    '''
+    Runs design-a-reactor.py with a reflector mesh and returns the final
+    k_eff, the number of FSRs and segments, the time to solution (sec) and
+    the wall clock time of the whole run (sec).
+    '''
+
+    command = ['python', 'design-a-reactor.py',
+               '--reflector-mesh=%s' % reflector_mesh] + options
+
+    start = time.time()
+    output = subprocess.check_output(command)
+    wall_time = time.time() - start
+
+    record = outputparser.parseOutput(output.splitlines(),
+                                      options=' '.join(command[2:]))
+
+    return record.keff, record.num_fsrs, record.num_segments, \
+           record.total_time, wall_time
+
+
+def main():
+
+    options = sys.argv[1:]
+    results = []
+
+    for reflector_mesh in REFLECTOR_MESHES:
+        print 'Simulating reflector mesh %s...' % reflector_mesh
+        results.append(runSimulation(reflector_mesh, options))
+
+    ref_keff, ref_fsrs, ref_segments, ref_time = results[0][:4]
+
+    lines = ['%-20s %9s %6s %10s %9s %7s %9s %9s' % \
+             ('Reflector mesh', 'FSRs', 'FSRs', 'Segments', 'Solve',
+              'Speed', 'Wall', 'k_eff'),
+             '%-20s %9s %6s %10s %9s %7s %9s %9s' % \
+             ('', '', '(%)', '', '(sec)', 'up', '(sec)', '(pcm)'),
+             '-' * 86]
+
+    for reflector_mesh, result in zip(REFLECTOR_MESHES, results):
+        keff, num_fsrs, num_segments, solve_time, wall_time = result
+        lines.append('%-20s %9d %6.1f %10d %9.2f %7.2f %9.2f %9.1f' % \
+                     (reflector_mesh, num_fsrs, 100. * num_fsrs / ref_fsrs,
+                      num_segments, solve_time, ref_time / solve_time,
+                      wall_time, 1E5 * (keff - ref_keff)))
+
+    lines.append('-' * 86)
+    lines.append('Reference k_eff (%s mesh) = %f' % \
+                 (REFLECTOR_MESHES[0], ref_keff))
+
+    report = '\n'.join(lines)
+    print report
+
+    with open('reflector-mesh-study.txt', 'w') as f:
+        f.write(report + '\n')
+
+
+if __name__ == '__main__':
+    main()
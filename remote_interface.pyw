@@ -5,6 +5,8 @@ import numpy as np
 import widgets
 import materials
 import simulate
+import preview
+import outputparser
 from PyQt4.QtCore import *
 from PyQt4.QtGui import *
 
@@ -80,10 +82,11 @@ class MainWindow(QMainWindow):
         self.top_left_frame.setLayout(self.top_left_layout)
 
         # Setup the bottom right quadrant with a display for keff convergence
-        self.keff_label = QLabel()
-        self.keff_label.setMaximumSize(1000, 375)
-        self.setupLabelPixmap(self.keff_label, 'keff.png', \
-                              self.bottom_right_layout, self.bottom_right_frame)
+        self.keff_plot = widgets.PlotWidget()
+        self.keff_plot.setMaximumSize(1000, 375)
+        self.setupKeffPlot()
+        self.bottom_right_layout.addWidget(self.keff_plot)
+        self.bottom_right_frame.setLayout(self.bottom_right_layout)
 
         # Setup the top right quadrant with a display for the fluxes
         self.flux7_label = QLabel()
@@ -189,9 +192,18 @@ class MainWindow(QMainWindow):
         self.progress.setValue(10)
         self.progress.label = QLabel('Idle')
         self.progress.setAlignment(Qt.AlignCenter)
+
+        # Setup the keff estimate from previous runs for the slider settings
+        self.keff_preview = preview.KeffPreview(self.openmoc_simulator.cache.records(),
+                                                self.openmoc_simulator.options)
+        self.preview_label = QLabel()
+        self.preview_label.setAlignment(Qt.AlignCenter)
+        self.updatePreview()
+
         self.bottom_left_layout.addWidget(self.progress, 0,0)
-        self.bottom_left_layout.addWidget(self.sliders_frame, 1, 0)
-        self.bottom_left_layout.addWidget(self.buttons_frame, 2, 0)
+        self.bottom_left_layout.addWidget(self.preview_label, 1, 0)
+        self.bottom_left_layout.addWidget(self.sliders_frame, 2, 0)
+        self.bottom_left_layout.addWidget(self.buttons_frame, 3, 0)
         self.bottom_left_frame.setLayout(self.bottom_left_layout)
 
         # Connect buttons SIGNALs with actions
@@ -204,6 +216,14 @@ class MainWindow(QMainWindow):
         self.connect(self.run_button, SIGNAL('clicked()'), self.runSimulation)
         self.connect(self.reset_button, SIGNAL('clicked()'), self.reset)
 
+        # Display the results of each simulation stage as soon as it finishes
+        self.progress_timer = QTimer()
+        self.connect(self.progress_timer, SIGNAL('timeout()'), self.advanceProgress)
+        self.connect(self.openmoc_simulator, SIGNAL('stageFinished(int)'), \
+                     self.displayResults)
+        self.connect(self.openmoc_simulator, SIGNAL('finished()'), \
+                     self.simulationFinished)
+
         # Add frames to each splitter
         self.right_split.addWidget(self.top_right_frame)
         self.right_split.addWidget(self.bottom_right_frame)
@@ -258,17 +278,24 @@ class MainWindow(QMainWindow):
 
         self.openmoc_simulator.spawnSimulationThread()
 
-        time.sleep(5.)
+        # Advance the progress bar until the simulation thread finishes
+        self.progress_timer.start(5000)
+
+
+    def advanceProgress(self):
+        '''
+        Advances the progress bar while a simulation is running
+        '''
+        self.progress.setValue(self.progress.value()+1)
+        self.progress.update()
 
-        # loop over progress update
-        while(self.openmoc_simulator.isRunning()):
-            self.progress.setValue(self.progress.value()+1)
-            self.progress.update()
-            self.progress.repaint()
-            time.sleep(5.)
 
-        self.setupLabelPixmap(self.keff_label, 'keff.png', \
-                            self.bottom_right_layout, self.bottom_right_frame)
+    def displayResults(self, stage):
+        '''
+        Repaints the keff convergence and flux plots with the results of
+        the latest simulation stage
+        '''
+        self.showKeffs(self.openmoc_simulator.keffs)
 
         flux1_pixMap = QPixmap('fsr-flux-group-1.png').scaled(self.flux1_label.size(),\
                                                             Qt.KeepAspectRatio)
@@ -284,17 +311,56 @@ class MainWindow(QMainWindow):
         self.top_right_layout.addWidget(self.flux7_label)
 
         self.top_right_frame.setLayout(self.top_right_layout)
+
+
+    def simulationFinished(self):
+        '''
+        Completes the progress bar once all simulation stages are done
+        '''
+        self.progress_timer.stop()
         self.progress.setValue(10)
+        if self.openmoc_simulator.failed:
+            self.progress.setFormat('Failed')
+        else:
+            self.progress.setFormat('%p%')
         self.progress.update()
 
+        # Refit the keff estimates to include the latest run
+        self.keff_preview.fit(self.openmoc_simulator.cache.records(),
+                              self.openmoc_simulator.options)
+        self.updatePreview()
+
         print 'finished simulation'
 
 
     def writeMaterialsFile(self):
         '''
-        Writes a materials HDF5 input file for OpenMOC based on the enrichment
-        slider settings. Must cast the slider domain of [-1,1] into a more
-        useful range for modifying the enrichments
+        Writes a materials HDF5 input file (or an in-memory HDF5 image) for
+        OpenMOC based on the enrichment slider settings. Must cast the slider
+        domain of [-1,1] into a more useful range for modifying the enrichments
+        '''
+
+        uo2_factor, mox1_factor, mox2_factor, mox3_factor, poison_factor, \
+            boron_factor = self.materialMultipliers()
+        self.openmoc_simulator.factors = (uo2_factor, mox1_factor, \
+                                          mox2_factor, mox3_factor, \
+                                          poison_factor, boron_factor)
+
+        if self.openmoc_simulator.use_materials_image:
+            self.openmoc_simulator.materials_image = \
+                materials.createMaterialsImage(uo2_factor, mox1_factor, \
+                                               mox2_factor, mox3_factor, \
+                                               poison_factor, boron_factor)
+        else:
+            materials.writeMaterialsFile(uo2_factor, mox1_factor, mox2_factor, \
+                                         mox3_factor, poison_factor, boron_factor)
+
+
+    def materialMultipliers(self):
+        '''
+        Returns the factors to multiply the UO2, MOX-4.3%, MOX-7%, MOX-8.7%
+        fission, guide tube absorption and water absorption xs by for the
+        current enrichment values
         '''
 
         uo2_factor = 0.0 + self.uo2_factor * 0.285714
@@ -303,8 +369,9 @@ class MainWindow(QMainWindow):
         mox3_factor = 0.0 + self.mox3_factor * 0.114943
         poison_factor = 0.0 + self.poison_factor * 0.2
         boron_factor = 0.0 + self.boron_factor * 0.000909
-        materials.writeMaterialsFile(uo2_factor, mox1_factor, mox2_factor, \
-                                     mox3_factor, poison_factor, boron_factor)
+
+        return (uo2_factor, mox1_factor, mox2_factor, mox3_factor, \
+                poison_factor, boron_factor)
 
 
     def updateSliders(self):
@@ -327,6 +394,24 @@ class MainWindow(QMainWindow):
         self.boron_slider.label.setText('Soluble boron ppm: ' + \
                                             str(self.boron_factor) + ' ppm')
 
+        self.updatePreview()
+
+
+    def updatePreview(self):
+        '''
+        Shows the keff estimated from previous runs for the current enrichment
+        values without running the solver
+        '''
+
+        keff, confidence = self.keff_preview.estimate(self.materialMultipliers())
+
+        if keff is None:
+            self.preview_label.setText('Estimated k: run OpenMOC first')
+        else:
+            self.preview_label.setText('Estimated k = %.5f: %s (%d%% confidence)' \
+                                       % (keff, preview.verdict(keff), \
+                                          round(100. * confidence)))
+
     def convertSliderValues(self):
         '''
         Converts the location of the slider into an enrichment value.
@@ -351,6 +436,35 @@ class MainWindow(QMainWindow):
         self.boron_factor = 1100.0 + 22.0 * position
 
 
+    def setupKeffPlot(self):
+        '''
+        Labels the keff convergence plot, draws the critical line and shows
+        the keffs of the last simulation, if any
+        '''
+        plot_item = self.keff_plot.pw.getPlotItem()
+        plot_item.setTitle('Multiplication Factor Convergence')
+        plot_item.setLabel('bottom', 'Iteration #')
+        plot_item.setLabel('left', 'Multiplication Factor')
+        self.keff_plot.add_reference_line(1.0)
+
+        output_file = self.openmoc_simulator.output_file
+        if os.path.isfile(output_file):
+            with open(output_file, 'r') as data:
+                self.showKeffs(outputparser.parseOutput(data).keffs)
+
+
+    def showKeffs(self, keffs):
+        '''
+        Plots the keff at each iteration of a simulation, with a verdict on
+        whether the reactor is critical by the final keff
+        '''
+        self.keff_plot.set_data(keffs)
+
+        if len(keffs) > 0:
+            self.keff_plot.set_text('%s: k = %.5f' % \
+                                    (preview.verdict(keffs[-1]), keffs[-1]))
+
+
     def setupLabelPixmap(self, label, filename, layout, frame):
         '''
         Used to paint and repaint labels with new images, load them
@@ -0,0 +1,142 @@
+'''
+    This file implements a content-addressed, on-disk cache of simulation
+    results. Each entry is keyed by a hash of the six enrichment factors
+    and the solver options, and holds the solver output (keff history and
+    timing report), the flux and keff plots and a JSON record of the run.
+    The least recently used entries are evicted once the cache grows past
+    its size limit.
+'''
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+
+
+class ResultCache(object):
+
+    def __init__(self, directory='cache', max_size=256*1024**2):
+        '''
+        directory - the directory holding one sub-directory per cached run
+        max_size  - the maximum size of the cache in bytes
+        '''
+
+        self.directory = directory
+        self.max_size = max_size
+        self.record_file = 'record.json'
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+
+    def key(self, factors, options):
+        '''
+        Returns the cache key for a run with the enrichment factors (uo2,
+        mox1, mox2, mox3, poison, boron) and the solver options string.
+        Factors are rounded so that equal slider settings share an entry.
+        '''
+
+        factors = [round(float(factor), 6) for factor in factors]
+        content = json.dumps({'factors': factors, 'options': options},
+                             sort_keys=True)
+        return hashlib.sha1(content).hexdigest()
+
+
+    def contains(self, key):
+        return os.path.isfile(os.path.join(self.directory, key,
+                                           self.record_file))
+
+
+    def fetch(self, key, files):
+        '''
+        Copies the cached files for a key into place and marks the entry as
+        recently used. Returns the run record, or None on a cache miss.
+        '''
+
+        if not self.contains(key):
+            return None
+
+        # Entries stored before a result file was added are misses
+        entry = os.path.join(self.directory, key)
+        for filename in files:
+            if not os.path.isfile(os.path.join(entry,
+                                               os.path.basename(filename))):
+                return None
+
+        for filename in files:
+            shutil.copy(os.path.join(entry, os.path.basename(filename)),
+                        filename)
+
+        # The entry's modification time records when it was last used
+        os.utime(entry, None)
+
+        with open(os.path.join(entry, self.record_file), 'r') as fh:
+            return json.load(fh)
+
+
+    def store(self, key, files, record):
+        '''
+        Stores copies of the result files and the run record for a key, and
+        then evicts the least recently used entries beyond the size limit.
+        '''
+
+        # Build the entry in a scratch directory and move it into place so
+        # that a partially written entry is never seen by fetch
+        scratch = tempfile.mkdtemp(dir=self.directory)
+        for filename in files:
+            shutil.copy(filename, scratch)
+
+        record = dict(record, key=key, time=time.time())
+        with open(os.path.join(scratch, self.record_file), 'w') as fh:
+            json.dump(record, fh)
+
+        entry = os.path.join(self.directory, key)
+        if os.path.isdir(entry):
+            shutil.rmtree(entry)
+        os.rename(scratch, entry)
+
+        self.evict()
+
+
+    def records(self):
+        '''
+        Returns the run records of all cached entries.
+        '''
+
+        records = []
+        for key in os.listdir(self.directory):
+            filename = os.path.join(self.directory, key, self.record_file)
+            if os.path.isfile(filename):
+                with open(filename, 'r') as fh:
+                    records.append(json.load(fh))
+
+        return records
+
+
+    def evict(self):
+        '''
+        Removes the least recently used entries until the cache fits within
+        its maximum size.
+        '''
+
+        entries = []
+        total_size = 0
+
+        for key in os.listdir(self.directory):
+            entry = os.path.join(self.directory, key)
+            if not os.path.isdir(entry):
+                continue
+
+            size = sum(os.path.getsize(os.path.join(entry, filename))
+                       for filename in os.listdir(entry))
+            entries.append((os.path.getmtime(entry), size, entry))
+            total_size += size
+
+        for mtime, size, entry in sorted(entries):
+            if total_size <= self.max_size:
+                break
+
+            shutil.rmtree(entry)
+            total_size -= size
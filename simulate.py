@@ -1,12 +1,35 @@
-from materials import *
-from sshUtil import *
-import os, sys
-import matplotlib.pyplot as plt
+from resultcache import ResultCache
+import solverdaemon
+import critsearch
+import jobs
+import outputparser
+import os, sys, io, re, glob, shutil, socket, tempfile, subprocess
 import numpy as np
+from distutils.spawn import find_executable
 
 from PyQt4.QtCore import *
 
 
+# OpenMOC's source convergence tolerance unless the options give one
+DEFAULT_TOLERANCE = 1E-5
+
+
+def convergenceProgress(residuals, tolerance):
+    '''
+    Estimates the percentage of a source iteration done from the residuals
+    so far, assuming they fall geometrically from the first non-zero
+    residual down to the tolerance
+    '''
+
+    residuals = [residual for residual in residuals if residual > 0.]
+    if not residuals or residuals[0] <= tolerance:
+        return 0
+
+    done = np.log(residuals[0] / residuals[-1]) / \
+           np.log(residuals[0] / tolerance)
+    return int(100 * np.clip(done, 0., 1.))
+
+
 class RemoteSimulator(QThread):
 
     def __init__(self):
@@ -17,6 +40,15 @@ class RemoteSimulator(QThread):
         self.flux1_file = 'fsr-flux-group-1.png'
         self.flux7_file = 'fsr-flux-group-7.png'
 
+        # The modules the input file imports, which go to the cluster with it
+        self.module_files = ['materials.py', 'corebuilder.py', 'trackcache.py',
+                             'fluxmap.py', 'solverdaemon.py']
+
+        # Hand the materials over as an in-memory HDF5 image rather than
+        # writing and reading back the materials file on the local disk
+        self.use_materials_image = True
+        self.materials_image = None
+
         # NOTE: Need to query local path, and ignore remote path
         self.remote_path = ''
         self.local_path = ''
@@ -24,96 +56,117 @@ class RemoteSimulator(QThread):
         # NOTE: What file will we use this time?
         self.output_file = 'output.txt'
 
+        # The keff at each iteration of the last run
+        self.keffs = np.zeros(0)
+
+        # The enrichment factors and solver options for the next run, which
+        # together key the cache of previous results
+        self.factors = None
+        self.options = '-a 16 -t 8 --tolerance=1E-3'
+        self.cache = ResultCache()
+        self.result_files = [self.output_file, \
+                             self.flux1_file, self.flux7_file]
+
+        # The iterations and timing of each run are kept as telemetry
+        self.telemetry = outputparser.TelemetryStore()
+
         # NOTE: Need to query host, username and password and cache it
         self.port = 22
         self.host = 'mightywboyd.mit.edu'
         self.uname = ''
         self.pwd = ''
 
+        # Whether the last simulation failed, e.g. its command on the cluster
+        # exited with an error or the connection was lost
+        self.failed = False
+
     def spawnSimulationThread(self):
+        self.failed = False
         self.start()
 
 
     def run(self):
+        import sshUtil
+
+        try:
+            self.runStage()
+        except (RuntimeError, IOError, EOFError, \
+                sshUtil.paramiko.SSHException) as error:
+            print 'The simulation failed: %s' % error
+            self.failed = True
+            return
+
+        self.emit(SIGNAL('stageFinished(int)'), 0)
+
 
-        # Copy the materials and input files to the cluster
+    def runStage(self):
+
+        # Reuse the results of a previous run with the same configuration
+        key = self.cache.key(self.factors, self.options)
+        record = self.cache.fetch(key, self.result_files)
+        if record is not None:
+            print 'Retrieved cached output data...'
+            self.keffs = np.array(record['keffs'])
+            return
+
+        # The SSH modules are only needed to reach the cluster, so they are
+        # imported on first use rather than when the GUI starts
+        import sshUtil
+
+        # Every transfer and command shares one authenticated connection to
+        # the cluster, which stays open between runs
+        session = sshUtil.get_session(self.uname, self.host, self.port, \
+                                      password=self.pwd)
+
+        # Copy the materials, the input file and its modules to the cluster
         print 'Transferring input to workstation...'
-        transport = paramiko.Transport((self.host,self.port))
-        transport.connect(username=self.uname, password=self.pwd)
-        sftp = paramiko.SFTPClient.from_transport(transport)
-        sftp.put(self.materials_file, self.materials_file)
-        sftp.put(self.input_file, self.input_file)
-        sftp.close()
-        transport.close()
-
-        # Setup a ssh connection for root and ask for the password interactively
-        print 'Running OpenMOC on the GPU...'
-        myconn = ssh_connection(self.uname, self.host, password=self.pwd)
+        if self.use_materials_image:
+            session.putfo(io.BytesIO(self.materials_image), self.materials_file)
+        else:
+            session.put(self.materials_file, self.materials_file)
+        for filename in [self.input_file] + self.module_files:
+            session.put(filename, filename)
 
-        run_remote(myconn,
-                    """
+        print 'Running OpenMOC on the GPU...'
+        session.run("""
                     rm -rf log/ plots/
                     export LD_LIBRARY_PATH=$LD_LIBRARY_PATH:/usr/local/cuda-5.5/lib64/
                     export PATH=$PATH:/usr/local/cuda-5.5/bin/
-                    python design-a-reactor.py -a 16 -t 8 --tolerance=1E-3
+                    python design-a-reactor.py %s
                     mv log/openmoc* log/output.txt
-                    """)
+                    """ % self.options)
 
         # Copy thermal flux plot to local directory
         print 'Retrieving output data...'
-        transport = paramiko.Transport((self.host,self.port))
-        transport.connect(username=self.uname, password=self.pwd)
-        sftp = paramiko.SFTPClient.from_transport(transport)
-        sftp.get('plots/' + self.flux1_file, self.flux1_file)
-        sftp.get('plots/' + self.flux7_file, self.flux7_file)
-        sftp.get('log/' + self.output_file, self.output_file)
-        sftp.close()
-        transport.close()
+        session.get('plots/' + self.flux1_file, self.flux1_file)
+        session.get('plots/' + self.flux7_file, self.flux7_file)
+        session.get('log/' + self.output_file, self.output_file)
 
         self.processData()
+        self.cacheResults(key, self.options)
+        self.telemetry.append(self.record)
 
 
     def processData(self):
         print 'Processing output data...'
 
-        # Parse the output file with keff at each iteration
-        data = open(self.output_file, "r" )
-        keffs = []
-        for line in data:
-            tokens = line.split()
-            if 'k_eff' not in tokens:
-                continue
-            else:
-                keffs.append(float(tokens[7]))
-
-        keffs = np.array(keffs)
-
-        # Generate a scatter plot for keff convergence
-        fig = plt.figure()
-        ax1 = fig.add_subplot(111)
-        ax1.plot([0.0, keffs.size], [1.0, 1.0], linestyle='-', linewidth='4')
-        ax1.scatter(range(keffs.size), keffs, color='tomato');
-        ax1.set_title('Multiplication Factor Convergence',fontsize=20)
-        ax1.set_xlabel('Iteration #',fontsize=16)
-        ax1.set_ylabel('Multiplication Factor',fontsize=16)
-        ax1.set_xlim([0, keffs.size])
-        ax1.grid(True, linestyle='-',color='1.0')
-        ax1.legend(['Critical', 'Your Reactor'], loc=10)
-
-        # Overlay txt to inform the user whether the reactor is critical
-        # subcritical or super-critical
-        if abs(keffs[keffs.size-1] - 1.0) < 1E-4:
-            plt.figtext(0.42, 0.3, 'Critical!!!', fontsize=24)
-            plt.figtext(0.43, 0.35, 'k = 1.0', fontsize=24)
-        elif keffs[keffs.size-1] < 1.0:
-            plt.figtext(0.40, 0.3, 'Sub-critical', fontsize=24)
-            plt.figtext(0.39, 0.35, 'k = ' + str(keffs[keffs.size-1]), fontsize=24)
-        else:
-            plt.figtext(0.38, 0.3, 'Super-critical', fontsize=24)
-            plt.figtext(0.38, 0.35, 'k = ' + str(keffs[keffs.size-1]), fontsize=24)    
+        # Parse the output file into a record of the iterations and timing
+        with open(self.output_file, 'r') as data:
+            self.record = outputparser.parseOutput(data, self.host, \
+                                                   self.options, self.factors)
+
+        # The GUI plots the keff convergence itself
+        self.keffs = np.array(self.record.keffs)
+
+
+    def cacheResults(self, key, options):
+        '''
+        Stores the output data from the last run in the results cache
+        '''
 
-        # Save plot and display to screen
-        plt.savefig('keff.png', bbox_inches='tight')
+        record = {'factors': list(self.factors), 'options': options,
+                  'keffs': self.keffs.tolist()}
+        self.cache.store(key, self.result_files, record)
 
 
 
@@ -124,8 +177,15 @@ class LocalSimulator(QThread):
 
         self.materials_file = 'design-a-reactor-materials.hdf5'
         self.input_file = 'design-a-reactor.py'
-        self.flux1_file = 'fsr-flux-group-1.png'
-        self.flux7_file = 'fsr-flux-group-7.png'
+
+        # The fluxes of every group and the FSR raster to display them
+        # through, which the GUI turns into images itself
+        self.flux_file = 'fluxes.npz'
+
+        # Hand the materials over as an in-memory HDF5 image rather than
+        # writing and reading back the materials file on the disk
+        self.use_materials_image = True
+        self.materials_image = None
 
         # NOTE: Need to query local path, and ignore remote path
         self.remote_path = ''
@@ -134,62 +194,371 @@ class LocalSimulator(QThread):
         # NOTE: What file will we use this time?
         self.output_file = 'output.txt'
 
+        # The keff at each iteration of the last run
+        self.keffs = np.zeros(0)
+
+        # The enrichment factors and solver options for the next run, which
+        # together key the cache of previous results
+        self.factors = None
+        self.options = '-a 16 -t 8 --tolerance=1E-3'
+        self.cache = ResultCache()
+        self.result_files = [self.output_file, self.flux_file]
+
+        # The iterations and timing of each run are kept as telemetry, and
+        # runs on this machine are recorded under its host name
+        self.telemetry = outputparser.TelemetryStore()
+        self.host = None
+
+        # First run a cheap, coarse simulation whose results are displayed,
+        # marked as coarse, while the simulation with the full solver options
+        # refines them
+        self.progressive = False
+        self.coarse_options = '-a 4 -s 0.5 -t 8 --tolerance=1E-2'
+        self.coarse = False
+
+        # Send the materials to resident solvers (design-a-reactor.py with
+        # --serve), one per set of solver options on consecutive ports,
+        # rather than starting a new OpenMOC process for each run. Each runs
+        # in a sandbox of its own, like the jobs do.
+        self.use_daemon = False
+        self.daemon_port = solverdaemon.DAEMON_PORT
+        self.daemon_ports = {}
+        self.daemons = {}
+        self.daemon_dirs = {}
+
+        # The connection and solver options of the request to a resident
+        # solver in progress, which cancel() interrupts
+        self.daemon_request = None
+
+        # Search for the critical value of this enrichment factor (e.g.
+        # 'boron') on the next run rather than simulating the factors as set
+        self.search_factor = None
+
+        # Each solve runs as a job in a sandbox of its own, which is killed
+        # if the simulation is cancelled or runs for over timeout seconds
+        self.job = None
+        self.timeout = None
+        self.cancelled = False
+
+        # Whether the last simulation failed, e.g. its solver crashed
+        self.failed = False
+
 
     def spawnSimulationThread(self):
+        self.cancelled = False
+        self.failed = False
         self.start()
 
 
+    def cancel(self):
+        '''
+        Cancels the running simulation, killing its solver process
+        '''
+
+        self.cancelled = True
+
+        job = self.job
+        if job is not None:
+            job.cancel()
+
+        # Shutting down the connection of a request to a resident solver
+        # ends the wait for its reply, and the solver then kills the solve
+        # and keeps serving
+        request = self.daemon_request
+        if request is not None:
+            sock, options = request
+
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+
     def run(self):
 
-        os.system('rm -rf log/ plots/')
-        os.system('python design-a-reactor.py -a 16 -t 8 --tolerance=1E-3 -f True')
-        os.system('mv plots/%s %s' % (self.flux1_file, self.flux1_file))
-        os.system('mv plots/%s %s' % (self.flux7_file, self.flux7_file))
-        os.system('mv log/openmoc* log/output.txt')
-        os.system('cp log/%s output.txt' % self.output_file)
+        if self.search_factor is not None:
+            self.searchCritical()
+            return
 
-        self.processData()
+        stages = [self.options]
 
+        # Skip the coarse stage if the refined results are already cached
+        if self.progressive and \
+           not self.cache.contains(self.cache.key(self.factors, self.options)):
+            stages.insert(0, self.coarse_options)
 
-    def processData(self):
-        print 'Processing output data...'
+        try:
+            for stage, options in enumerate(stages):
+                self.runStage(options)
+                self.emit(SIGNAL('stageFinished(int)'), stage)
+        except jobs.JobCancelled:
+            print 'Cancelled the simulation'
+        except (RuntimeError, IOError) as error:
+            print 'The simulation failed: %s' % error
+            self.failed = True
+
+
+    def runStage(self, options):
+
+        if self.cancelled:
+            raise jobs.JobCancelled('Cancelled before solving')
+
+        # The coarse results are only a preview of the refined ones
+        self.coarse = options == self.coarse_options
 
-        # Parse the output file with keff at each iteration
-        data = open(self.output_file, "r" )
-        keffs = []
-        for line in data:
-            tokens = line.split()
-            if 'k_eff' not in tokens:
+        # Reuse the results of a previous run with the same configuration
+        key = self.cache.key(self.factors, options)
+        record = self.cache.fetch(key, self.result_files)
+        if record is not None:
+            print 'Retrieved cached output data...'
+            self.keffs = np.array(record['keffs'])
+            return
+
+        if self.use_daemon:
+            self.solveWithDaemon(options)
+        else:
+            self.solveInSandbox(options)
+
+        self.processData(options)
+        self.cacheResults(key, options)
+        self.telemetry.append(self.record)
+
+
+    def solveInSandbox(self, options):
+        '''
+        Solves for the current materials with a new solver process, run as a
+        job in a sandbox of its own, and copies the results out of the
+        sandbox. Raises JobCancelled if the simulation is cancelled.
+        '''
+
+        # The sandbox is the working directory, so every input the solver
+        # reads from the project directory is given by its absolute path
+        command = ['python', os.path.abspath(self.input_file)] + \
+                  options.split() + \
+                  ['-f', 'True', '--flux-file=%s' % self.flux_file, \
+                   '--track-cache=%s' % os.path.abspath('track-cache')]
+
+        # Pipe the in-memory materials image straight to the solver
+        if self.use_materials_image:
+            command.append('--materials=-')
+            image = self.materials_image
+        else:
+            command.append('--materials=%s' % os.path.abspath(self.materials_file))
+            image = None
+
+        job = jobs.SolverJob(command, image, self.timeout)
+        self.job = job
+
+        try:
+            # The simulation may have been cancelled before the job existed
+            if self.cancelled:
+                job.cancel()
+
+            self.streamOutput(iter(job.start().readline, ''), options)
+            job.wait()
+
+            shutil.copy(glob.glob(job.path('log/openmoc*'))[0], self.output_file)
+            shutil.copy(job.path(self.flux_file), self.flux_file)
+        finally:
+            self.job = None
+            job.cleanup()
+
+
+    def streamOutput(self, lines, options, output=None):
+        '''
+        Echoes the lines of solver output as they arrive, copying them to the
+        output file if one is given, and emits
+        iterationFinished(int, double, double, int) with the iteration
+        number, keff, residual and the estimated percentage of the source
+        iteration done after each source iteration
+        '''
+
+        match = re.search(r'--tolerance[= ]([-+.0-9Ee]+)', options)
+        tolerance = float(match.group(1)) if match else DEFAULT_TOLERANCE
+        residuals = []
+
+        for line in lines:
+            sys.stdout.write(line)
+            if output is not None:
+                output.write(line)
+
+            iteration = outputparser.parseIteration(line)
+            if iteration is None:
                 continue
-            else:
-                keffs.append(float(tokens[7]))
-
-        keffs = np.array(keffs)
-
-        # Generate a scatter plot for keff convergence
-        fig = plt.figure()
-        ax1 = fig.add_subplot(111)
-        ax1.plot([0.0, keffs.size], [1.0, 1.0], linestyle='-', linewidth='4')
-        ax1.scatter(range(keffs.size), keffs, color='tomato');
-        ax1.set_title('Multiplication Factor Convergence',fontsize=20)
-        ax1.set_xlabel('Iteration #',fontsize=16)
-        ax1.set_ylabel('Multiplication Factor',fontsize=16)
-        ax1.set_xlim([0, keffs.size])
-        ax1.grid(True, linestyle='-',color='1.0')
-        ax1.legend(['Critical', 'Your Reactor'], loc=10)
-
-        # Overlay txt to inform the user whether the reactor is critical
-        # subcritical or super-critical
-        if abs(keffs[keffs.size-1] - 1.0) < 1E-4:
-            plt.figtext(0.42, 0.3, 'Critical!!!', fontsize=24)
-            plt.figtext(0.43, 0.35, 'k = 1.0', fontsize=24)
-        elif keffs[keffs.size-1] < 1.0:
-            plt.figtext(0.40, 0.3, 'Sub-critical', fontsize=24)
-            plt.figtext(0.39, 0.35, 'k = ' + str(keffs[keffs.size-1]), fontsize=24)
+
+            number, keff, residual = iteration
+            residuals.append(residual)
+            self.emit(SIGNAL('iterationFinished(int, double, double, int)'), \
+                      number, keff, residual, \
+                      convergenceProgress(residuals, tolerance))
+
+
+    def searchCritical(self):
+        '''
+        Searches for the critical value of the search factor from the current
+        factors, displaying the results of each solve as a stage, and emits
+        criticalFound(double) with the critical value of the factor
+        '''
+
+        keffFunction = critsearch.SimulatorKeff(self)
+        solves = []
+
+        def solve(factors):
+            keff = keffFunction(factors)
+            self.emit(SIGNAL('stageFinished(int)'), len(solves))
+            solves.append(keff)
+            return keff
+
+        try:
+            value, keff, history = \
+                critsearch.criticalitySearch(solve, self.factors,
+                                             self.search_factor)
+            print 'Critical %s factor = %f (k_eff = %f, %d solves)' % \
+                  (self.search_factor, value, keff, len(history))
+            self.emit(SIGNAL('criticalFound(double)'), value)
+        except ValueError as error:
+            print error
+        except jobs.JobCancelled:
+            print 'Cancelled the criticality search'
+        except (RuntimeError, IOError) as error:
+            print 'The criticality search failed: %s' % error
+            self.failed = True
+        finally:
+            self.search_factor = None
+
+
+    def solveWithDaemon(self, options):
+        '''
+        Solves for the current materials with the resident solver for the
+        solver options, starting it in a sandbox on first use, streams the
+        solver output into the output file as it runs and copies the fluxes
+        out of the sandbox. Raises JobCancelled if the simulation is
+        cancelled, or an IOError if the connection to the solver is lost.
+        '''
+
+        if self.use_materials_image:
+            image = self.materials_image
+        else:
+            image = open(self.materials_file, 'rb').read()
+
+        # The solver options are fixed when a resident solver starts
+        if options not in self.daemon_ports:
+            self.daemon_ports[options] = self.daemon_port + len(self.daemon_ports)
+        port = self.daemon_ports[options]
+
+        # Only the solvers started here are used, as the fluxes are copied
+        # out of their sandboxes
+        if options in self.daemons:
+            sock = solverdaemon.connect(port)
+        else:
+            sock = None
+
+        if sock is None:
+            print 'Starting the resident OpenMOC solver...'
+            self.stopDaemon(options)
+            self.startDaemon(options, port, image)
+
+            # Wait for the geometry and tracks to be built
+            sock = solverdaemon.connect(port, timeout=600.)
+
+            if sock is None:
+                raise RuntimeError('The resident OpenMOC solver on port %d ' \
+                                   'did not start' % port)
+
+        self.daemon_request = (sock, options)
+
+        try:
+            # The simulation may have been cancelled before the request existed
+            if self.cancelled:
+                raise jobs.JobCancelled('Cancelled before solving')
+
+            with open(self.output_file, 'w') as output:
+                self.streamOutput(solverdaemon.requestSolve(sock, image), \
+                                  options, output)
+
+            shutil.copy(os.path.join(self.daemon_dirs[options], \
+                                     self.flux_file), self.flux_file)
+        except IOError:
+            if self.cancelled:
+                raise jobs.JobCancelled('Cancelled the resident solver')
+            raise
+        finally:
+            self.daemon_request = None
+            sock.close()
+
+
+    def startDaemon(self, options, port, image):
+        '''
+        Starts a resident solver for the solver options on a port, with a
+        sandbox of its own as its working directory, and hands it the
+        materials image to build the geometry with
+        '''
+
+        directory = tempfile.mkdtemp(prefix='daemon-')
+
+        # Every input the solver reads from the project directory is given
+        # by its absolute path
+        command = ['python', os.path.abspath(self.input_file)] + \
+                  options.split() + \
+                  ['-f', 'True', '--flux-file=%s' % self.flux_file, \
+                   '--track-cache=%s' % os.path.abspath('track-cache'), \
+                   '--materials=-', '--serve=%d' % port]
+
+        # Line buffer the solver's C stdout from the start, so that each
+        # line of a solve is forwarded as it is printed
+        if find_executable('stdbuf'):
+            command = ['stdbuf', '-oL'] + command
+
+        # The solver forks a child for each solve, which cannot use an
+        # OpenMP thread pool started before the fork, so the solver builds
+        # the geometry and tracks on a single thread and only the solves
+        # use the threads of the solver options
+        environment = dict(os.environ, PYTHONUNBUFFERED='1',
+                           OMP_NUM_THREADS='1')
+
+        daemon = subprocess.Popen(command, cwd=directory, \
+                                  stdin=subprocess.PIPE, env=environment)
+        daemon.stdin.write(image)
+        daemon.stdin.close()
+        self.daemons[options] = daemon
+        self.daemon_dirs[options] = directory
+
+
+    def stopDaemon(self, options=None):
+        '''
+        Stops the resident solver for the solver options, or every resident
+        solver started by this simulator if no options are given
+        '''
+
+        if options is None:
+            stopping = self.daemons.keys()
         else:
-            plt.figtext(0.38, 0.3, 'Super-critical', fontsize=24)
-            plt.figtext(0.38, 0.35, 'k = ' + str(keffs[keffs.size-1]), fontsize=24)    
+            stopping = [options] if options in self.daemons else []
+
+        for options in stopping:
+            daemon = self.daemons.pop(options)
+            daemon.terminate()
+            daemon.wait()
+            shutil.rmtree(self.daemon_dirs.pop(options), ignore_errors=True)
+
+
+    def processData(self, options):
+        print 'Processing output data...'
+
+        # Parse the output file into a record of the iterations and timing
+        with open(self.output_file, 'r') as data:
+            self.record = outputparser.parseOutput(data, self.host, \
+                                                   options, self.factors)
+
+        # The GUI plots the keff convergence itself
+        self.keffs = np.array(self.record.keffs)
+
 
-        # Save plot and display to screen
-        plt.savefig('keff.png', bbox_inches='tight')
+    def cacheResults(self, key, options):
+        '''
+        Stores the output data from the last run in the results cache
+        '''
 
+        record = {'factors': list(self.factors), 'options': options,
+                  'keffs': self.keffs.tolist(), 'coarse': self.coarse}
+        self.cache.store(key, self.result_files, record)
@@ -0,0 +1,201 @@
+'''
+    This file implements the messaging between the GUI and a resident
+    OpenMOC solver started with 'python design-a-reactor.py --serve=PORT'.
+    The solver builds the geometry and tracks once and then listens on a
+    local socket. Each request carries an in-memory materials HDF5 image
+    (see materials.createMaterialsImage), and the reply streams each line of
+    the solver output for that solve as it is printed, in the same format as
+    the OpenMOC log, and ends once the solve is done or with the error
+    which failed the solve. Each solve runs in a child process, so that a
+    client cancels its request by closing the connection, which kills the
+    solve but leaves the resident solver serving.
+'''
+
+import os
+import sys
+import time
+import errno
+import select
+import signal
+import socket
+import struct
+import ctypes
+
+
+DAEMON_HOST = '127.0.0.1'
+DAEMON_PORT = 50607
+
+# Messages are prefixed by their length as an unsigned 64-bit integer
+HEADER = struct.Struct('!Q')
+
+
+def sendMessage(sock, data):
+    sock.sendall(HEADER.pack(len(data)) + data)
+
+
+def recvMessage(sock):
+    length = HEADER.unpack(recvExactly(sock, HEADER.size))[0]
+    return recvExactly(sock, length)
+
+
+def sendReply(sock, kind, data):
+    '''
+    Sends a reply of a kind ('LINE', 'DONE' or 'ERROR') to a solve request.
+    '''
+
+    sendMessage(sock, kind)
+    sendMessage(sock, data)
+
+
+def recvReply(sock):
+    '''
+    Returns the kind and data of a reply to a solve request.
+    '''
+
+    return recvMessage(sock), recvMessage(sock)
+
+
+def recvExactly(sock, length):
+    chunks = []
+    while length > 0:
+        chunk = sock.recv(min(length, 1 << 20))
+        if not chunk:
+            raise IOError('Solver connection closed mid-message')
+        chunks.append(chunk)
+        length -= len(chunk)
+
+    return ''.join(chunks)
+
+
+def listen(port=DAEMON_PORT, host=DAEMON_HOST):
+    '''
+    Returns a server socket accepting connections from the local machine.
+    '''
+
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((host, port))
+    server.listen(1)
+    return server
+
+
+def connect(port=DAEMON_PORT, host=DAEMON_HOST, timeout=0.):
+    '''
+    Connects to a resident solver, retrying for up to timeout seconds while
+    it starts up. Returns None if no solver is listening.
+    '''
+
+    deadline = time.time() + timeout
+
+    while True:
+        try:
+            return socket.create_connection((host, port))
+        except socket.error as error:
+            if error.errno != errno.ECONNREFUSED or time.time() > deadline:
+                return None
+            time.sleep(0.1)
+
+
+def requestSolve(sock, image):
+    '''
+    Sends a materials HDF5 image to a resident solver and yields each line
+    of the solver output as it is printed, until the solver has converged
+    the source with the new materials. Raises a RuntimeError if the solver
+    failed to solve.
+    '''
+
+    sendMessage(sock, image)
+
+    while True:
+        kind, data = recvReply(sock)
+
+        if kind == 'LINE':
+            yield data
+        elif kind == 'ERROR':
+            raise RuntimeError('The resident solver failed: %s' % data)
+        else:
+            return
+
+
+def forwardOutput(sock, function, *args):
+    '''
+    Calls a function and sends everything it writes to the stdout file
+    descriptor, including the output of OpenMOC's C++ logger, over a socket
+    as 'LINE' replies as it is written. The lines are only sent as they are
+    printed if the C stdout is line buffered, e.g. by running the solver
+    with 'stdbuf -oL'.
+    '''
+
+    libc = ctypes.CDLL(None)
+    sys.stdout.flush()
+    libc.fflush(None)
+
+    # The output is forwarded by a child process rather than a thread, as
+    # the solver holds the interpreter lock throughout the source iteration
+    read_fd, write_fd = os.pipe()
+    forwarder = os.fork()
+
+    if forwarder == 0:
+        os.close(write_fd)
+        pipe = os.fdopen(read_fd, 'r')
+
+        # Keep draining the pipe if the client goes away, so that the solver
+        # never blocks on a full pipe
+        try:
+            for line in iter(pipe.readline, ''):
+                if sock is not None:
+                    try:
+                        sendReply(sock, 'LINE', line)
+                    except IOError:
+                        sock = None
+        finally:
+            os._exit(0)
+
+    os.close(read_fd)
+    saved_stdout = os.dup(1)
+    os.dup2(write_fd, 1)
+    os.close(write_fd)
+
+    try:
+        function(*args)
+    finally:
+        sys.stdout.flush()
+        libc.fflush(None)
+        os.dup2(saved_stdout, 1)
+        os.close(saved_stdout)
+
+        # The forwarder is done once the pipe closes
+        os.waitpid(forwarder, 0)
+
+
+def serveRequest(sock, function, *args):
+    '''
+    Calls a function, which replies to the request on a socket, in a child
+    process forked from the resident solver, and kills the child if the
+    client closes the connection before the reply is done. The parent never
+    changes, so that every request is solved from the same resident state.
+    Returns True if the request was served, or False if it was cancelled.
+    '''
+
+    sys.stdout.flush()
+    ctypes.CDLL(None).fflush(None)
+    child = os.fork()
+
+    if child == 0:
+        status = 1
+        try:
+            function(*args)
+            status = 0
+        finally:
+            os._exit(status)
+
+    while True:
+        if os.waitpid(child, os.WNOHANG)[0] == child:
+            return True
+
+        # A client sends nothing after its request, so the connection only
+        # becomes readable once the client has closed it, which it also does
+        # right after the reply, possibly before the child has exited
+        if select.select([sock], [], [], 0.1)[0]:
+            os.kill(child, signal.SIGKILL)
+            return not os.WIFSIGNALED(os.waitpid(child, 0)[1])
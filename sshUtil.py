@@ -1,5 +1,7 @@
 import paramiko
 import getpass
+import socket
+import threading
 
 
 def ssh_connection(user, host, port=22, password=None, key_filename=None):
@@ -24,6 +26,11 @@ def ssh_connection(user, host, port=22, password=None, key_filename=None):
 
 
 def run_remote(ssh, cmd, check_exit_status=True, verbose=True):
+    """
+    runs a command on a new exec channel and returns its output and exit
+    status. raises a RuntimeError if check_exit_status is set and the
+    command exited with a non-zero status
+    """
     chan = ssh.get_transport().open_session()
     stdin = chan.makefile('wb')
     stdout = chan.makefile('rb')
@@ -50,8 +57,141 @@ def run_remote(ssh, cmd, check_exit_status=True, verbose=True):
             print line,
     if check_exit_status and exit_status != 0:
         print_output()
-        print 'non-zero exit status (%d) when running "%s"' % (exit_status, cmd)
-        exit(exit_status)
+        raise RuntimeError('non-zero exit status (%d) when running "%s"' %
+                           (exit_status, cmd))
     if verbose:
         print_output()
     return result
+
+
+class SSHSession(object):
+    """
+    one authenticated ssh transport to a host which is kept alive between
+    uses, with sftp and exec channels multiplexed over it. the transport is
+    reconnected automatically when it has dropped, and a transfer which
+    fails on a dropped transport is retried once on a new one. commands are
+    never retried, as a command may have run before its transport dropped.
+
+    connect is called as connect(user, host, port, password, key_filename)
+    and returns a connected paramiko.SSHClient, which is ssh_connection
+    unless another (e.g. for a local sshd stand-in) is given
+    """
+
+    def __init__(self, user, host, port=22, password=None, key_filename=None,
+                 keepalive=30, connect=ssh_connection):
+        self.user = user
+        self.host = host
+        self.port = port
+        self.password = password
+        self.key_filename = key_filename
+        self.keepalive = keepalive
+        self.connect = connect
+
+        self.ssh = None
+        self._sftp = None
+        self.num_connects = 0
+        self.lock = threading.RLock()
+
+    def is_active(self):
+        return self.ssh is not None and \
+               self.ssh.get_transport() is not None and \
+               self.ssh.get_transport().is_active()
+
+    def client(self):
+        """
+        returns the connected paramiko.SSHClient, reconnecting if needed
+        """
+        with self.lock:
+            if not self.is_active():
+                self.close()
+                self.ssh = self.connect(self.user, self.host, self.port,
+                                        self.password, self.key_filename)
+                self.num_connects += 1
+
+                # keep the password prompted for on first connect, so that
+                # reconnecting never prompts again
+                self.password = getattr(self.ssh, 'password', self.password)
+
+                # keep idle sessions from being dropped by firewalls
+                if self.keepalive:
+                    self.ssh.get_transport().set_keepalive(self.keepalive)
+
+            return self.ssh
+
+    def sftp(self):
+        """
+        returns an sftp client on a channel of the session's transport
+        """
+        with self.lock:
+            ssh = self.client()
+            if self._sftp is None or self._sftp.get_channel().closed:
+                self._sftp = ssh.open_sftp()
+            return self._sftp
+
+    def _retry(self, operation):
+        # retry once on a fresh transport if the transport had dropped, which
+        # is only safe for operations which can be repeated
+        try:
+            return operation()
+        except (paramiko.SSHException, socket.error, EOFError):
+            if self.is_active():
+                raise
+            return operation()
+
+    def put(self, localpath, remotepath):
+        return self._retry(lambda: self.sftp().put(localpath, remotepath))
+
+    def putfo(self, fl, remotepath):
+        def putfo():
+            fl.seek(0)
+            return self.sftp().putfo(fl, remotepath)
+        return self._retry(putfo)
+
+    def get(self, remotepath, localpath):
+        return self._retry(lambda: self.sftp().get(remotepath, localpath))
+
+    def run(self, cmd, check_exit_status=True, verbose=True):
+        """
+        runs a command on an exec channel of the session (see run_remote).
+        the session reconnects first if its transport has dropped, but the
+        command is not retried if the transport drops while it runs
+        """
+        return run_remote(self.client(), cmd, check_exit_status, verbose)
+
+    def close(self):
+        with self.lock:
+            if self._sftp is not None:
+                self._sftp.close()
+                self._sftp = None
+            if self.ssh is not None:
+                self.ssh.close()
+                self.ssh = None
+
+
+# the pooled sessions by (user, host, port)
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(user, host, port=22, password=None, key_filename=None,
+                **kwargs):
+    """
+    returns the pooled session to user@host:port, creating it on first use.
+    the session connects on first use and stays connected between calls
+    """
+    with _sessions_lock:
+        key = (user, host, port)
+        if key not in _sessions:
+            _sessions[key] = SSHSession(user, host, port, password,
+                                        key_filename, **kwargs)
+        return _sessions[key]
+
+
+def close_sessions():
+    """
+    closes every pooled session
+    """
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
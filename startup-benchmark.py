@@ -0,0 +1,113 @@
+'''
+    This script measures how quickly a Design-a-Reactor GUI starts. Each run
+    starts a fresh Python process, as a kiosk relaunch does, and times
+    importing Qt, importing the interface and its modules, building the
+    MainWindow and the first paint of the window. It also lists the heavy
+    modules which were imported by the first paint, which should only be
+    those the window needs to draw itself.
+
+    Usage: python startup-benchmark.py [interface] [runs]
+
+    benchmarks local_interface.pyw 5 times unless another interface or
+    number of runs is given.
+'''
+
+import sys
+import subprocess
+import numpy as np
+
+
+# Modules which are slow to import and only needed once a simulation runs
+HEAVY_MODULES = ['h5py', 'paramiko', 'matplotlib', 'scipy', 'openmoc']
+
+# The stages of startup timed in each process
+STAGES = ['Qt import', 'Interface import', 'MainWindow', 'First paint']
+
+# Run in a fresh process to time one startup and print the stage timings
+# and the heavy modules imported by the first paint
+CHILD = '''
+import sys, time
+start = time.time()
+
+import imp
+from PyQt4.QtCore import QObject, QEvent, QTimer
+from PyQt4.QtGui import QApplication
+
+app = QApplication(sys.argv)
+times = [time.time()]
+
+interface = imp.load_source('interface', %r)
+times.append(time.time())
+
+class PaintWatcher(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and len(times) == 3:
+            times.append(time.time())
+            QTimer.singleShot(0, app.quit)
+        return False
+
+watcher = PaintWatcher()
+app.installEventFilter(watcher)
+
+window = interface.MainWindow()
+times.append(time.time())
+window.show()
+app.exec_()
+
+heavy = [name for name in %r if name in sys.modules]
+print 'STARTUP %%s %%s' %% (' '.join('%%f' %% (t - start) for t in times),
+                            ','.join(heavy) or '-')
+'''
+
+
+def timeStartup(interface):
+    '''
+    Starts the interface in a fresh process and returns the time (sec) from
+    the start of the process to the end of each stage of startup, and the
+    heavy modules imported by the first paint.
+    '''
+
+    output = subprocess.check_output(['python', '-c', CHILD % \
+                                      (interface, HEAVY_MODULES)])
+
+    for line in output.splitlines():
+        if line.startswith('STARTUP '):
+            tokens = line.split()
+            times = [float(token) for token in tokens[1:-1]]
+            heavy = [] if tokens[-1] == '-' else tokens[-1].split(',')
+            return times, heavy
+
+    raise RuntimeError('%s did not paint its MainWindow' % interface)
+
+
+def main():
+
+    interface = sys.argv[1] if len(sys.argv) > 1 else 'local_interface.pyw'
+    num_runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    times = []
+    for run in range(num_runs):
+        run_times, heavy = timeStartup(interface)
+        times.append(run_times)
+
+    # The time spent in each stage rather than since the process started
+    times = np.diff(np.hstack((np.zeros((num_runs, 1)), times)), axis=1)
+
+    print 'Startup of %s over %d runs:' % (interface, num_runs)
+    print '%-20s %10s %10s' % ('Stage', 'Mean (ms)', 'Min (ms)')
+    print '-' * 42
+
+    for stage, stage_times in zip(STAGES, times.T):
+        print '%-20s %10.1f %10.1f' % (stage, 1E3 * stage_times.mean(),
+                                       1E3 * stage_times.min())
+
+    print '-' * 42
+    print '%-20s %10.1f %10.1f' % ('Time to first paint',
+                                   1E3 * times.sum(axis=1).mean(),
+                                   1E3 * times.sum(axis=1).min())
+    print 'Heavy modules imported by the first paint: %s' % \
+          (', '.join(heavy) or 'none')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+'''
+    This file runs headless sweeps over the six GUI sliders (UO2, MOX-4.3%,
+    MOX-7%, MOX-8.7%, poison and boron). The slider settings are sampled on a
+    grid or by Latin hypercube sampling, solved on a pool of worker processes
+    and the results are appended to a columnar HDF5 store as each solve
+    finishes. Each OpenMOC solve runs in its own scratch directory, so that
+    concurrent solves never share the log/ and plots/ directories.
+
+    Usage: python sweep.py [--grid N | --lhs N] [sweep options] [OpenMOC options]
+
+    The OpenMOC options (e.g. '-a 16 -t 2 --tolerance=1E-3') are passed on to
+    every solve. Run with --help for the sweep options.
+'''
+
+import os
+import time
+import argparse
+import itertools
+import multiprocessing
+import h5py
+import numpy as np
+import materials as c5g7
+import critsearch
+import jobs
+import outputparser
+
+
+# The (initial value, value per slider step, factor per unit value) of each
+# slider, as in MainWindow.convertSliderValues and materialMultipliers
+SLIDERS = [(3.5, 0.07, 0.285714),
+           (4.3, 0.086, 0.232558),
+           (7.0, 0.14, 0.142857),
+           (8.7, 0.174, 0.114943),
+           (5.0, 0.1, 0.2),
+           (1100.0, 22.0, critsearch.BORON_FACTOR_PER_PPM)]
+
+# The range of each slider's positions
+SLIDER_RANGE = (-50, 50)
+
+
+def sliderFactors(positions):
+    '''
+    Returns the enrichment factors (uo2, mox1, mox2, mox3, poison, boron) for
+    the six slider positions.
+    '''
+
+    return tuple((initial + step * position) * factor for
+                 position, (initial, step, factor) in zip(positions, SLIDERS))
+
+
+def gridPositions(num_points):
+    '''
+    Returns the slider positions of a grid with num_points evenly spaced
+    positions per slider, including the ends of the range.
+    '''
+
+    points = np.linspace(SLIDER_RANGE[0], SLIDER_RANGE[1], num_points)
+    return [positions for positions in itertools.product(points, repeat=6)]
+
+
+def latinHypercubePositions(num_samples, seed=None):
+    '''
+    Returns num_samples slider positions by Latin hypercube sampling, where
+    each slider's range is divided into num_samples equal strata and each
+    stratum is sampled exactly once.
+    '''
+
+    random = np.random.RandomState(seed)
+    low, high = SLIDER_RANGE
+
+    samples = np.empty((num_samples, 6))
+    for slider in range(6):
+        strata = random.permutation(num_samples)
+        samples[:, slider] = (strata + random.uniform(size=num_samples)) / \
+                             num_samples
+
+    return [tuple(positions) for positions in low + (high - low) * samples]
+
+
+def solveOpenMOC(factors, options, track_cache, keep=False):
+    '''
+    Runs design-a-reactor.py for a set of enrichment factors in a scratch
+    directory of its own, and returns keff, the number of source iterations
+    and OpenMOC's time to solution (sec). The scratch directory is removed
+    afterwards unless keep is set.
+    '''
+
+    script = os.path.abspath('design-a-reactor.py')
+    command = ['python', script, '--materials=-',
+               '--track-cache=%s' % track_cache] + options.split()
+
+    job = jobs.SolverJob(command, c5g7.createMaterialsImage(*factors),
+                         prefix='sweep-')
+
+    try:
+        record = outputparser.parseOutput(job.communicate().splitlines(),
+                                          options=options, factors=factors)
+        outputparser.TelemetryStore().append(record)
+
+        return record.keff, record.num_iterations, record.total_time
+
+    finally:
+        if not keep:
+            job.cleanup()
+
+
+# Each worker process keeps one diffusion solver and warm-starts every solve
+# from its previous solution
+_diffusion_keff = None
+
+def solveDiffusion(factors):
+    '''
+    Returns keff, the number of power iterations and the time to solution
+    (sec) of the diffusion solver for a set of enrichment factors.
+    '''
+
+    global _diffusion_keff
+
+    if _diffusion_keff is None:
+        _diffusion_keff = critsearch.DiffusionKeff()
+
+    start = time.time()
+    keff = _diffusion_keff(factors)
+
+    return keff, _diffusion_keff.solver.num_iterations, time.time() - start
+
+
+def runJob(job):
+    '''
+    Solves one job of a sweep, given as (index, slider positions, solver,
+    OpenMOC options, track cache directory, keep), and returns the index,
+    positions, factors, keff, number of iterations and times of the solve.
+    Failed solves have a keff of NaN, so that one bad job never stops a sweep.
+    '''
+
+    index, positions, solver, options, track_cache, keep = job
+    factors = sliderFactors(positions)
+    start = time.time()
+
+    try:
+        if solver == 'diffusion':
+            keff, num_iterations, solve_time = solveDiffusion(factors)
+        else:
+            keff, num_iterations, solve_time = \
+                solveOpenMOC(factors, options, track_cache, keep)
+    except Exception as error:
+        print 'Job %d failed: %s' % (index, error)
+        keff, num_iterations, solve_time = np.nan, 0, np.nan
+
+    return (index, positions, factors, keff, num_iterations, solve_time,
+            time.time() - start)
+
+
+class SweepStore(object):
+    '''
+    A columnar HDF5 store of sweep results with one resizable dataset per
+    column, which is flushed after each result so that a sweep can be read
+    while it runs and survives being interrupted.
+    '''
+
+    COLUMNS = [('index', np.int64, ()),
+               ('positions', np.float64, (6,)),
+               ('factors', np.float64, (6,)),
+               ('keff', np.float64, ()),
+               ('iterations', np.int64, ()),
+               ('solve_time', np.float64, ()),
+               ('wall_time', np.float64, ())]
+
+    def __init__(self, filename, attributes=None):
+
+        self.file = h5py.File(filename, 'w')
+
+        for name, dtype, shape in self.COLUMNS:
+            self.file.create_dataset(name, (0,) + shape, dtype=dtype,
+                                     maxshape=(None,) + shape,
+                                     chunks=(256,) + shape)
+
+        for name, value in (attributes or {}).items():
+            self.file.attrs[name] = value
+
+        self.num_rows = 0
+
+
+    def append(self, row):
+        '''
+        Appends one result, with a value for each column, to the store.
+        '''
+
+        for (name, dtype, shape), value in zip(self.COLUMNS, row):
+            column = self.file[name]
+            column.resize((self.num_rows + 1,) + shape)
+            column[self.num_rows] = value
+
+        self.num_rows += 1
+        self.file.flush()
+
+
+    def close(self):
+        self.file.close()
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Sweeps the Design-a-' \
+                                     'Reactor sliders')
+    samples = parser.add_mutually_exclusive_group(required=True)
+    samples.add_argument('--grid', type=int, metavar='N',
+                         help='N evenly spaced positions of each slider ' \
+                              '(N**6 solves)')
+    samples.add_argument('--lhs', type=int, metavar='N',
+                         help='N Latin hypercube samples of the sliders')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='random seed of the Latin hypercube samples')
+    parser.add_argument('--solver', choices=['openmoc', 'diffusion'],
+                        default='openmoc', help='solver for each sample')
+    parser.add_argument('--processes', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help='number of solves to run at once')
+    parser.add_argument('--output', default='sweep.h5',
+                        help='HDF5 file to store the results in')
+    parser.add_argument('--track-cache', default='track-cache',
+                        help='directory caching the tracks for the solves')
+    parser.add_argument('--keep-jobs', action='store_true',
+                        help='keep the scratch directory of each solve')
+    args, openmoc_options = parser.parse_known_args()
+
+    if args.grid:
+        positions = gridPositions(args.grid)
+    else:
+        positions = latinHypercubePositions(args.lhs, args.seed)
+
+    options = ' '.join(openmoc_options)
+    track_cache = os.path.abspath(args.track_cache)
+    sweep_jobs = [(index, job_positions, args.solver, options, track_cache,
+                   args.keep_jobs)
+                  for index, job_positions in enumerate(positions)]
+
+    store = SweepStore(args.output, {'solver': args.solver,
+                                     'options': options})
+
+    print 'Sweeping %d configurations on %d processes...' % \
+          (len(sweep_jobs), args.processes)
+    start = time.time()
+
+    # Solve the first job alone so that the others share its cached tracks
+    # rather than all tracing and writing the same tracks at once
+    result = runJob(sweep_jobs[0])
+    store.append(result)
+    print '[%d/%d] k_eff = %f' % (store.num_rows, len(sweep_jobs), result[3])
+
+    pool = multiprocessing.Pool(args.processes)
+
+    try:
+        for result in pool.imap_unordered(runJob, sweep_jobs[1:]):
+            store.append(result)
+            print '[%d/%d] k_eff = %f' % (store.num_rows, len(sweep_jobs),
+                                          result[3])
+    finally:
+        pool.close()
+        pool.join()
+        store.close()
+
+    print 'Swept %d configurations in %.1f sec into %s' % \
+          (len(sweep_jobs), time.time() - start, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+'''
+    Regression checks of the NumPy MOC solver (moc.py) against its known
+    solution for a UO2 pin cell with the cross-sections of the GUI sliders
+    at their unit multipliers.
+
+    Usage: python -m unittest discover tests
+'''
+
+import unittest
+import materials as c5g7
+import moc
+
+
+class PinCellTest(unittest.TestCase):
+
+    def setUp(self):
+
+        f = c5g7.openMaterialsImage(c5g7.createMaterialsImage(1., 1., 1., 1.,
+                                                              1., 1.))
+        self.xs = c5g7.readMaterials(f)
+        f.close()
+
+
+    def test_uo2_pin_cell(self):
+
+        solver = moc.pinCell(self.xs, 'U', num_azim=16, track_spacing=0.05)
+        keff, fluxes = solver.solve()
+
+        self.assertAlmostEqual(keff, 1.32335, delta=1E-5)
+        self.assertEqual(solver.num_iterations, 36)
+        self.assertTrue((fluxes > 0.).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
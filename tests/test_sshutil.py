@@ -0,0 +1,204 @@
+'''
+    Checks of the pooled SSH sessions (sshUtil.py) against stand-ins for a
+    paramiko client, its transport, exec channels and SFTP client, which
+    count the connections made and the commands run.
+
+    Usage: python -m unittest discover tests
+'''
+
+import socket
+import unittest
+
+try:
+    import sshUtil
+except ImportError:
+    sshUtil = None
+
+
+class FakeFile(object):
+
+    def __init__(self, channel, lines=()):
+        self.channel = channel
+        self.lines = list(lines)
+
+    def write(self, data):
+        pass
+
+    def flush(self):
+        pass
+
+    def __iter__(self):
+        return iter(self.lines)
+
+
+class FakeChannel(object):
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.closed = True
+        self.exit_status = 0
+
+    def makefile(self, mode):
+        return FakeFile(self)
+
+    def makefile_stderr(self, mode):
+        return FakeFile(self)
+
+    def exec_command(self, cmd):
+        self.transport.server.commands.append(cmd)
+        self.exit_status = self.transport.server.exit_status
+
+    def recv_exit_status(self):
+        # The transport drops while the command runs
+        if self.transport.server.drop_during_command:
+            self.transport.active = False
+            raise EOFError('transport dropped')
+        return self.exit_status
+
+
+class FakeTransport(object):
+
+    def __init__(self, server):
+        self.server = server
+        self.active = True
+
+    def is_active(self):
+        return self.active
+
+    def set_keepalive(self, interval):
+        pass
+
+    def open_session(self):
+        return FakeChannel(self)
+
+
+class FakeSFTP(object):
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.channel = FakeChannel(transport)
+        self.channel.closed = False
+
+    def get_channel(self):
+        return self.channel
+
+    def put(self, localpath, remotepath):
+        # The transport has dropped since the last use
+        if self.transport.server.drop_before_transfer:
+            self.transport.server.drop_before_transfer = False
+            self.transport.active = False
+            raise socket.error('transport dropped')
+        self.transport.server.transfers.append(remotepath)
+
+    def putfo(self, fl, remotepath):
+        self.put(None, remotepath)
+
+    def get(self, remotepath, localpath):
+        self.transport.server.transfers.append(remotepath)
+
+    def close(self):
+        self.channel.closed = True
+
+
+class FakeClient(object):
+
+    def __init__(self, server):
+        self.transport = FakeTransport(server)
+        self.use_sudo = False
+        self.password = None
+
+    def get_transport(self):
+        return self.transport
+
+    def open_sftp(self):
+        return FakeSFTP(self.transport)
+
+    def close(self):
+        self.transport.active = False
+
+
+class FakeServer(object):
+    '''
+    Stands in for sshUtil.ssh_connection, connecting fake clients
+    '''
+
+    def __init__(self):
+        self.num_connects = 0
+        self.commands = []
+        self.transfers = []
+        self.exit_status = 0
+        self.drop_during_command = False
+        self.drop_before_transfer = False
+
+    def __call__(self, user, host, port, password, key_filename):
+        self.num_connects += 1
+        return FakeClient(self)
+
+
+@unittest.skipIf(sshUtil is None, 'paramiko is not installed')
+class SSHSessionTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.server = FakeServer()
+        self.session = sshUtil.SSHSession('user', 'host',
+                                          connect=self.server)
+
+
+    def test_one_connection(self):
+
+        for run in range(3):
+            self.session.put('design-a-reactor.py', 'design-a-reactor.py')
+            self.session.run('python design-a-reactor.py', verbose=False)
+
+        self.assertEqual(self.server.num_connects, 1)
+        self.assertEqual(len(self.server.commands), 3)
+        self.assertEqual(len(self.server.transfers), 3)
+
+
+    def test_transfer_retried_on_new_transport(self):
+
+        self.session.put('design-a-reactor.py', 'design-a-reactor.py')
+        self.server.drop_before_transfer = True
+        self.session.put('materials.py', 'materials.py')
+
+        self.assertEqual(self.server.num_connects, 2)
+        self.assertEqual(self.server.transfers,
+                         ['design-a-reactor.py', 'materials.py'])
+
+
+    def test_command_not_retried(self):
+
+        self.server.drop_during_command = True
+        self.assertRaises(EOFError, self.session.run,
+                          'python design-a-reactor.py', verbose=False)
+        self.assertEqual(self.server.commands, ['python design-a-reactor.py'])
+
+        # The next command reconnects
+        self.server.drop_during_command = False
+        self.session.run('ls', verbose=False)
+        self.assertEqual(self.server.num_connects, 2)
+
+
+    def test_failed_command_raises(self):
+
+        self.server.exit_status = 1
+        self.assertRaises(RuntimeError, self.session.run,
+                          'python design-a-reactor.py', verbose=False)
+
+
+    def test_sessions_pooled(self):
+
+        try:
+            first = sshUtil.get_session('user', 'host', connect=self.server)
+            second = sshUtil.get_session('user', 'host', connect=self.server)
+            other = sshUtil.get_session('user', 'other', connect=self.server)
+
+            self.assertTrue(first is second)
+            self.assertFalse(first is other)
+        finally:
+            sshUtil.close_sessions()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+'''
+    This file keeps the segmented tracks generated by OpenMOC on disk for
+    each geometry and track layout, so that ray tracing is only paid once
+    per geometry rather than once per simulation. OpenMOC's TrackGenerator
+    reads the tracks from its track file in the 'tracks' directory when one
+    exists for the same geometry, and otherwise writes one after ray tracing.
+    The 'tracks' directory is linked to a cache directory keyed by a hash of
+    the geometry, the number of azimuthal angles and the track spacing, so
+    that different geometries never overwrite each other's tracks.
+'''
+
+import os
+import errno
+import hashlib
+
+
+def geometryKey(geometry, num_azim, track_spacing):
+    '''
+    Returns the cache key for the tracks of an OpenMOC geometry laid out
+    with num_azim azimuthal angles and the track spacing (cm).
+    '''
+
+    content = '%s\n%d\n%r' % (geometry.toString(), num_azim, track_spacing)
+    return hashlib.sha1(content).hexdigest()
+
+
+def linkTracksDirectory(key, cache_dir='track-cache', tracks_dir='tracks'):
+    '''
+    Points OpenMOC's tracks directory at the cache directory for a key,
+    creating it if the tracks have not been generated before. Returns the
+    cache directory. Raises a RuntimeError if the tracks directory is a
+    directory of its own rather than a link, which is never deleted.
+    '''
+
+    directory = os.path.abspath(os.path.join(cache_dir, key))
+    try:
+        os.makedirs(directory)
+    except OSError as error:
+        if error.errno != errno.EEXIST:
+            raise
+
+    if os.path.isdir(tracks_dir) and not os.path.islink(tracks_dir):
+        raise RuntimeError('%s is a directory rather than a link to the track '
+                           'cache; move it away, or disable the track cache, '
+                           'to run' % os.path.abspath(tracks_dir))
+
+    # Replace the link to another geometry's tracks in one rename, so that
+    # concurrent runs never see the link missing or fail to create it
+    scratch = '%s.%d' % (tracks_dir, os.getpid())
+    if os.path.islink(scratch):
+        os.remove(scratch)
+
+    os.symlink(directory, scratch)
+    os.rename(scratch, tracks_dir)
+
+    return directory
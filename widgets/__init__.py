@@ -3,4 +3,5 @@ from logwatcher import *
 from plotwidget import *
 from patternlist import *
 from diagwidgets import *
+from fluxdisplay import *
 
@@ -0,0 +1,88 @@
+from __future__ import division
+
+import os
+
+import numpy as np
+
+from PyQt4.QtCore import *
+from PyQt4.QtGui import *
+
+
+def jet_color_table(n=256):
+    """Returns the jet colormap as a color table of n qRgb values"""
+
+    x = np.linspace(0.,1.,n)
+    r = np.clip(1.5 - np.abs(4.*x - 3.),0.,1.)
+    g = np.clip(1.5 - np.abs(4.*x - 2.),0.,1.)
+    b = np.clip(1.5 - np.abs(4.*x - 1.),0.,1.)
+
+    return [qRgb(*rgb) for rgb in
+            np.round(255.*np.column_stack((r,g,b))).astype(int).tolist()]
+
+JET = jet_color_table()
+
+
+def flux_image(flux,color_table=JET):
+    """Returns an 8-bit indexed QImage of a 2D flux array, with the fluxes
+    scaled onto the color table from their minimum to their maximum"""
+
+    low, high = flux.min(), flux.max()
+    scale = (len(color_table) - 1) / (high - low) if high > low else 0.
+
+    indices = np.ascontiguousarray((flux - low)*scale, dtype=np.uint8)
+    rows, cols = indices.shape
+
+    img = QImage(indices.data,cols,rows,cols,QImage.Format_Indexed8)
+    img.setColorTable(color_table)
+
+    # Copy the pixels out of the array, which is freed on return
+    return img.copy()
+
+
+class FluxDisplay(QLabel):
+    """Displays the flux of one energy group from the (rows, cols, groups)
+    flux images of a simulation, falling back to a placeholder image until
+    there are fluxes to display"""
+
+    def __init__(self,group,placeholder=None,parent=None):
+        QLabel.__init__(self,parent)
+
+        self.group = group
+        self.placeholder = placeholder
+        self.images = None
+
+        self.setAlignment(Qt.AlignCenter)
+
+    def set_fluxes(self,images):
+        self.images = images
+        self.refresh()
+
+    def set_group(self,group):
+        self.group = group
+        self.refresh()
+
+    def load(self,filename):
+        """Displays the fluxes in a file saved by fluxmap.saveFluxes, or the
+        placeholder if there is no such file"""
+
+        import fluxmap
+
+        if os.path.isfile(filename):
+            self.set_fluxes(fluxmap.loadFluxImages(filename))
+        else:
+            self.images = None
+            self.refresh()
+
+    def resizeEvent(self,event):
+        QLabel.resizeEvent(self,event)
+        self.refresh()
+
+    def refresh(self):
+        if self.images is not None and self.group <= self.images.shape[2]:
+            pixmap = QPixmap.fromImage(flux_image(self.images[:,:,self.group-1]))
+        elif self.placeholder:
+            pixmap = QPixmap(self.placeholder)
+        else:
+            return
+
+        self.setPixmap(pixmap.scaled(self.size(),Qt.KeepAspectRatio))
@@ -22,6 +22,8 @@ class PlotWidget(QWidget):
         self.setLayout(l)
         
         self.rect = None
+        self.text = None
+        self.references = []
 
     def add_point(self,y,x=None):
         
@@ -43,16 +45,50 @@ class PlotWidget(QWidget):
         self.rect = self.pw.plot(x=[cur_x], y=[y], pen=(200,200,200), symbolBrush=(255,0,0), symbolPen='w')
         
 
+    def set_data(self,y,x=None):
+        self.y = list(y)
+        if x is None:
+            self.x = range(len(self.y))
+        else:
+            self.x = list(x)
+
+        self.refresh()
+
+    def add_reference_line(self,y,pen=(100,100,255)):
+        """Draws a horizontal line at y which is always kept in view"""
+
+        line = pg.InfiniteLine(pos=y,angle=0,pen=pg.mkPen(pen,width=4))
+        self.pw.addItem(line)
+        self.references.append(y)
+        self.refresh()
+
+    def set_text(self,text):
+        """Shows text by the last point, or no text if text is None"""
+
+        self.pw.removeItem(self.text)
+        self.text = None
+
+        if text is not None and self.y:
+            self.text = pg.TextItem(text,anchor=(1,1))
+            self.text.setPos(self.x[-1],self.y[-1])
+            self.pw.addItem(self.text)
+
     def refresh(self):
         self.plot.setData(y=self.y,x=self.x)
         if len(self.x) == 1:
           self.pw.setXRange(0,1,padding=0)
         else:
           self.pw.autoRange()
-          
+
+        # Keep the reference lines in view with the data
+        if self.references:
+            y = self.y + self.references
+            self.pw.setYRange(min(y),max(y))
+
     def clear(self):
         self.x = []
         self.y = []
+        self.set_text(None)
         self.refresh()
         
     def move_selection(self,i):